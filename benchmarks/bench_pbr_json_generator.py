@@ -0,0 +1,302 @@
+"""Benchmarks for pbr_json_generator on a synthetic MO2 mods folder.
+
+Fabricates MO2-style mod folders in a temporary directory and times mod
+discovery, ``_build_rmaos_index``, generate mode and update mode, reporting
+items/sec and peak traced memory for each, plus the plugin's import time in
+a fresh interpreter (what MO2 pays at every startup).  The run fails (exit
+code 1) when importing the plugin pulls in a module it is meant to load
+lazily and, with a stored baseline, when any benchmark's throughput drops
+by more than the tolerance:
+
+    python benchmarks/bench_pbr_json_generator.py --save-baseline
+    python benchmarks/bench_pbr_json_generator.py --mods 500 --textures 200
+
+Baselines are machine specific; record one on the machine that compares.
+"""
+
+import argparse
+import json
+import random
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import pbr_json_generator as pjg  # noqa: E402
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "baseline.json"
+# Header of a 4x4 BC7 texture, enough for the generator's header checks.
+DDS_STUB = (
+    b"DDS " + struct.pack("<7I44x", 124, 0x1007, 4, 4, 16, 0, 1)
+    + struct.pack("<2I4s5I", 32, 0x4, b"DX10", 0, 0, 0, 0, 0)
+    + struct.pack("<5I", 0x1000, 0, 0, 0, 0)
+    + struct.pack("<5I", 98, 3, 0, 1, 0)
+)
+# Modules the plugin defers until first use (see _load_qt() and _load_ui()).
+DEFERRED_MODULES = (
+    "PyQt6", "PyQt5", "PySide2", "argparse", "concurrent.futures",
+    "multiprocessing", "cProfile", "pstats", "tracemalloc", "difflib",
+    "numpy",
+)
+IMPORT_PROBE = """
+import sys, time
+start = time.perf_counter()
+import pbr_json_generator
+print(time.perf_counter() - start)
+print(" ".join(m for m in {deferred!r} if m in sys.modules))
+"""
+
+
+# ---------------------------------------------------------------------------
+# Synthetic mod tree
+# ---------------------------------------------------------------------------
+
+def make_mod_tree(root: Path, mods=50, textures=200, depth=3,
+                  companion_ratio=0.3, jsons=20, entries=10,
+                  stale_ratio=0.2, seed=1234):
+    """Create *mods* MO2 mod folders below *root*.
+
+    Every mod gets ``meta.ini`` and *textures* ``_rmaos.dds`` files spread
+    over directories *depth* levels deep, each companion (``_g``, ``_f``,
+    ``_p``, ``_s``, ``_cnr``) present with probability *companion_ratio*.
+    Every other mod also gets *jsons* PBRNifPatcher JSONs of *entries*
+    entries; *stale_ratio* of those point at a moved directory so update
+    mode exercises its filename fallback.  Returns the number of texture
+    sets created.
+    """
+    rng = random.Random(seed)
+    created = 0
+    for m in range(mods):
+        mod = root / f"Synthetic Mod {m:04d}"
+        pbr = mod / pjg.PBR_TEX_REL
+        pbr.mkdir(parents=True)
+        (mod / "meta.ini").write_text("[General]\n", encoding="utf-8")
+
+        stems = []
+        for t in range(textures):
+            rel = Path(*(f"dir{(t >> (2 * d)) % 4}" for d in range(depth)))
+            (pbr / rel).mkdir(parents=True, exist_ok=True)
+            stem = rel / f"texture{t:05d}"
+            (pbr / f"{stem}_rmaos.dds").write_bytes(DDS_STUB)
+            for suffix in pjg.COMPANION_SUFFIXES:
+                if rng.random() < companion_ratio:
+                    (pbr / f"{stem}_{suffix}.dds").write_bytes(DDS_STUB)
+            stems.append(stem)
+            created += 1
+
+        if m % 2 or not jsons:
+            continue
+        patcher = mod / pjg.PATCHER_DIR
+        patcher.mkdir()
+        for j in range(jsons):
+            data = []
+            for _ in range(entries):
+                stem = rng.choice(stems)
+                if rng.random() < stale_ratio:
+                    stem = Path("moved") / stem.name
+                data.append({
+                    "texture": str(stem).replace("/", "\\"),
+                    "specular_level": 0.04,
+                    "roughness_scale": 1.0,
+                })
+            with open(patcher / f"patch{j:04d}.json", "w",
+                      encoding="utf-8") as f:
+                json.dump(data, f, indent=4)
+    return created
+
+
+# ---------------------------------------------------------------------------
+# Measurement
+# ---------------------------------------------------------------------------
+
+def measure(func, repeat=3, setup=None):
+    """Return ``(best_seconds, peak_bytes)`` over *repeat* calls of *func*.
+
+    *setup* runs untimed before every call.  Memory is traced on a separate
+    call so tracemalloc's overhead does not skew the timings.
+    """
+    best = None
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    if setup is not None:
+        setup()
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return best, peak
+
+
+def measure_import(repeat=5):
+    """Return ``(best_seconds, eagerly_loaded)`` for importing the plugin.
+
+    Every attempt runs in a fresh interpreter, after one untimed import
+    that leaves the bytecode cache warm.  *eagerly_loaded* lists the
+    ``DEFERRED_MODULES`` the import pulled in anyway.
+    """
+    probe = IMPORT_PROBE.format(deferred=DEFERRED_MODULES)
+
+    def run():
+        out = subprocess.run(
+            [sys.executable, "-c", probe], cwd=REPO_ROOT,
+            capture_output=True, text=True, check=True,
+        ).stdout.splitlines()
+        return float(out[0]), (out[1].split() if len(out) > 1 else [])
+
+    _, loaded = run()
+    best = min(run()[0] for _ in range(repeat))
+    return best, loaded
+
+
+def run_benchmarks(root: Path, args) -> dict:
+    mods_path = root / "mods"
+    mods_path.mkdir()
+    cache_path = root / "discovery_cache.json"
+    texture_count = make_mod_tree(
+        mods_path, mods=args.mods, textures=args.textures, depth=args.depth,
+        companion_ratio=args.companions, jsons=args.jsons,
+        entries=args.entries,
+    )
+    mod_folders, patcher_mods = pjg._discover_mods(mods_path)
+    json_count = sum(
+        1 for mod in patcher_mods for _ in (mod / pjg.PATCHER_DIR).iterdir()
+    )
+    settings = {"specular_level": 0.04, "roughness_scale": 1.0}
+    if args.settings:
+        settings = json.loads(args.settings.read_text(encoding="utf-8"))
+    pjg._discover_mods(mods_path, cache_path)
+
+    def clear_output(name):
+        def setup():
+            shutil.rmtree(mods_path / name, ignore_errors=True)
+        return setup
+
+    cases = [
+        ("discovery", args.mods,
+         lambda: pjg._discover_mods(mods_path), None),
+        ("discovery_cached", args.mods,
+         lambda: pjg._discover_mods(mods_path, cache_path), None),
+        ("rmaos_index", texture_count,
+         lambda: [pjg._build_rmaos_index(m / pjg.PBR_TEX_REL)
+                  for m in mod_folders], None),
+        ("generate", texture_count,
+         lambda: pjg._run_generate(mods_path, mod_folders, True, settings,
+                                   args.workers),
+         clear_output(pjg.OUTPUT_MOD_NAME)),
+        ("update", json_count,
+         lambda: pjg._run_update(mods_path, patcher_mods, True,
+                                 args.processes),
+         clear_output(pjg.EXISTING_OUTPUT_MOD_NAME)),
+    ]
+
+    results = {}
+    for name, items, func, setup in cases:
+        seconds, peak = measure(func, args.repeat, setup)
+        results[name] = {
+            "items": items,
+            "seconds": seconds,
+            "items_per_sec": items / seconds if seconds else float("inf"),
+            "peak_bytes": peak,
+        }
+        print(f"{name:<17} {items:>8} items  {seconds:9.3f}s  "
+              f"{results[name]['items_per_sec']:>12.1f} items/s  "
+              f"peak {peak / 1048576:8.2f} MiB")
+
+    seconds, loaded = measure_import(args.repeat)
+    results["import"] = {
+        "items": 1,
+        "seconds": seconds,
+        "items_per_sec": 1 / seconds if seconds else float("inf"),
+        "eagerly_loaded": loaded,
+    }
+    print(f"{'import':<17} {1:>8} items  {seconds:9.3f}s  "
+          f"{results['import']['items_per_sec']:>12.1f} items/s")
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Return a message for every benchmark slower than the baseline allows."""
+    regressions = [
+        f"import: loads {module} eagerly"
+        for module in results.get("import", {}).get("eagerly_loaded", ())
+    ]
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        floor = base["items_per_sec"] * (1.0 - tolerance)
+        if result["items_per_sec"] < floor:
+            regressions.append(
+                f"{name}: {result['items_per_sec']:.1f} items/s is below "
+                f"{floor:.1f} (baseline {base['items_per_sec']:.1f})"
+            )
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mods", type=int, default=50)
+    parser.add_argument("--textures", type=int, default=200,
+                        help="_rmaos.dds files per mod")
+    parser.add_argument("--depth", type=int, default=3,
+                        help="directory depth below Textures/PBR")
+    parser.add_argument("--companions", type=float, default=0.3,
+                        help="probability of each companion texture")
+    parser.add_argument("--jsons", type=int, default=20,
+                        help="PBRNifPatcher JSONs per patcher mod")
+    parser.add_argument("--entries", type=int, default=10,
+                        help="entries per PBRNifPatcher JSON")
+    parser.add_argument("--settings", type=Path,
+                        help="generator settings JSON for generate mode")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed throughput drop before failing")
+    parser.add_argument("--keep", action="store_true",
+                        help="keep the synthetic mods folder")
+    args = parser.parse_args(argv)
+
+    root = Path(tempfile.mkdtemp(prefix="pbr_bench_"))
+    try:
+        results = run_benchmarks(root, args)
+    finally:
+        if args.keep:
+            print(f"Synthetic mods kept in {root}")
+        else:
+            shutil.rmtree(root, ignore_errors=True)
+
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(results, indent=4),
+                                 encoding="utf-8")
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    baseline = {}
+    if args.baseline.exists():
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+    regressions = compare(results, baseline, args.tolerance)
+    for message in regressions:
+        print(f"REGRESSION {message}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
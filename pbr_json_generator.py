@@ -1,300 +1,3329 @@
+import contextlib
+import hashlib
+import itertools
 import json
+import os
+import re
+import struct
+import sys
+import threading
+import time
 from pathlib import Path
 
-import mobase
+# argparse, concurrent.futures, multiprocessing and the profilers are
+# imported where they are used: MO2 imports this plugin at every startup.
+
+try:
+    import mobase
+except ImportError:
+    # Update-mode worker processes import this module outside of MO2.
+    mobase = None
+
+try:
+    import orjson
+except ImportError:
+    # Optional faster JSON backend; the stdlib encoder is the fallback.
+    orjson = None
 
 # ---------------------------------------------------------------------------
 # Qt Compatibility: PyQt6 -> PyQt5 -> PySide2 -> minimal stubs
 # ---------------------------------------------------------------------------
 
-try:
-    from PyQt6.QtWidgets import (
-        QMessageBox, QDialog, QVBoxLayout, QHBoxLayout, QFormLayout,
-        QLabel, QListWidget, QListWidgetItem, QDialogButtonBox,
-        QCheckBox, QLineEdit, QTabWidget, QDoubleSpinBox, QWidget,
-    )
-    from PyQt6.QtGui import QIcon
-    from PyQt6.QtCore import Qt
-
-    ITEM_IS_USER_CHECKABLE = Qt.ItemFlag.ItemIsUserCheckable
-    ITEM_IS_ENABLED = Qt.ItemFlag.ItemIsEnabled
-    USER_ROLE = Qt.ItemDataRole.UserRole
-    CHECKED = Qt.CheckState.Checked
-    UNCHECKED = Qt.CheckState.Unchecked
-except ImportError:
+# MO2 imports every plugin at startup, but the tool is opened a few times a
+# session: the binding is only resolved by _load_qt() (all icon() needs) and
+# the Qt model and dialog classes are only built by _load_ui() on display().
+
+def _import_qt() -> dict:
+    """Import the first available binding; return its names and constants."""
     try:
-        from PyQt5.QtWidgets import (
+        from PyQt6.QtWidgets import (
             QMessageBox, QDialog, QVBoxLayout, QHBoxLayout, QFormLayout,
-            QLabel, QListWidget, QListWidgetItem, QDialogButtonBox,
+            QLabel, QListView, QDialogButtonBox, QProgressDialog,
+            QApplication,
             QCheckBox, QLineEdit, QTabWidget, QDoubleSpinBox, QWidget,
         )
-        from PyQt5.QtGui import QIcon
-        from PyQt5.QtCore import Qt
-
-        ITEM_IS_USER_CHECKABLE = Qt.ItemIsUserCheckable
-        ITEM_IS_ENABLED = Qt.ItemIsEnabled
-        USER_ROLE = Qt.UserRole
-        CHECKED = Qt.Checked
-        UNCHECKED = Qt.Unchecked
+        from PyQt6.QtGui import QIcon
+        from PyQt6.QtCore import (
+            Qt, QAbstractListModel, QModelIndex, QSortFilterProxyModel, QTimer,
+        )
+
+        ITEM_IS_USER_CHECKABLE = Qt.ItemFlag.ItemIsUserCheckable
+        ITEM_IS_ENABLED = Qt.ItemFlag.ItemIsEnabled
+        ITEM_IS_SELECTABLE = Qt.ItemFlag.ItemIsSelectable
+        DISPLAY_ROLE = Qt.ItemDataRole.DisplayRole
+        CHECK_STATE_ROLE = Qt.ItemDataRole.CheckStateRole
+        USER_ROLE = Qt.ItemDataRole.UserRole
+        CHECKED = Qt.CheckState.Checked
+        UNCHECKED = Qt.CheckState.Unchecked
+        WINDOW_MODAL = Qt.WindowModality.WindowModal
     except ImportError:
         try:
-            from PySide2.QtWidgets import (
+            from PyQt5.QtWidgets import (
                 QMessageBox, QDialog, QVBoxLayout, QHBoxLayout, QFormLayout,
-                QLabel, QListWidget, QListWidgetItem, QDialogButtonBox,
+                QLabel, QListView, QDialogButtonBox, QProgressDialog,
+                QApplication,
                 QCheckBox, QLineEdit, QTabWidget, QDoubleSpinBox, QWidget,
             )
-            from PySide2.QtGui import QIcon
-            from PySide2.QtCore import Qt
+            from PyQt5.QtGui import QIcon
+            from PyQt5.QtCore import (
+                Qt, QAbstractListModel, QModelIndex, QSortFilterProxyModel,
+                QTimer,
+            )
+
+            ITEM_IS_USER_CHECKABLE = Qt.ItemIsUserCheckable
+            ITEM_IS_ENABLED = Qt.ItemIsEnabled
+            ITEM_IS_SELECTABLE = Qt.ItemIsSelectable
+            DISPLAY_ROLE = Qt.DisplayRole
+            CHECK_STATE_ROLE = Qt.CheckStateRole
+            USER_ROLE = Qt.UserRole
+            CHECKED = Qt.Checked
+            UNCHECKED = Qt.Unchecked
+            WINDOW_MODAL = Qt.WindowModal
+        except ImportError:
+            try:
+                from PySide2.QtWidgets import (
+                    QMessageBox, QDialog, QVBoxLayout, QHBoxLayout,
+                    QFormLayout, QLabel, QListView, QDialogButtonBox,
+                    QProgressDialog, QApplication,
+                    QCheckBox, QLineEdit, QTabWidget, QDoubleSpinBox, QWidget,
+                )
+                from PySide2.QtGui import QIcon
+                from PySide2.QtCore import (
+                    Qt, QAbstractListModel, QModelIndex, QSortFilterProxyModel,
+                    QTimer,
+                )
+
+                ITEM_IS_USER_CHECKABLE = Qt.ItemIsUserCheckable
+                ITEM_IS_ENABLED = Qt.ItemIsEnabled
+                ITEM_IS_SELECTABLE = Qt.ItemIsSelectable
+                DISPLAY_ROLE = Qt.DisplayRole
+                CHECK_STATE_ROLE = Qt.CheckStateRole
+                USER_ROLE = Qt.UserRole
+                CHECKED = Qt.Checked
+                UNCHECKED = Qt.Unchecked
+                WINDOW_MODAL = Qt.WindowModal
+            except ImportError:
+                # Fallback stubs so the module can at least be imported in
+                # environments that lack a Qt binding (e.g. linting, testing).
+
+                class _Signal:
+                    """Dummy signal supporting .connect() and .emit() calls."""
+                    def connect(self, slot):
+                        pass
+
+                    def emit(self, *args):
+                        pass
+
+                class QMessageBox:
+                    @staticmethod
+                    def information(parent, title, message):
+                        print(f"INFO [{title}]: {message}")
+
+                    @staticmethod
+                    def warning(parent, title, message):
+                        print(f"WARNING [{title}]: {message}")
+
+                    @staticmethod
+                    def critical(parent, title, message):
+                        print(f"CRITICAL [{title}]: {message}")
+
+                    class StandardButton:
+                        Ok = 1024
+                        Cancel = 4194304
+                        Yes = 16384
+                        No = 65536
+
+                class QDialog:
+                    class DialogCode:
+                        Accepted = 1
+                        Rejected = 0
+
+                    def __init__(self, parent=None):
+                        pass
+
+                    def exec(self):
+                        return 0
+
+                    def setWindowTitle(self, title):
+                        pass
+
+                    def setMinimumWidth(self, w):
+                        pass
+
+                    def setMinimumHeight(self, h):
+                        pass
+
+                    def accept(self):
+                        pass
+
+                    def reject(self):
+                        pass
+
+                class QVBoxLayout:
+                    def __init__(self, parent=None):
+                        pass
+
+                    def addWidget(self, widget):
+                        pass
+
+                class QLabel:
+                    def __init__(self, text=""):
+                        self._text = text
+
+                    def setText(self, text):
+                        self._text = text
+
+                class QListView:
+                    def __init__(self, parent=None):
+                        self._model = None
+
+                    def setModel(self, model):
+                        self._model = model
+
+                    def model(self):
+                        return self._model
+
+                    def setUniformItemSizes(self, enabled):
+                        pass
+
+                    def setEnabled(self, enabled):
+                        pass
+
+                class QModelIndex:
+                    def __init__(self, row=-1):
+                        self._row = row
+
+                    def isValid(self):
+                        return self._row >= 0
+
+                    def row(self):
+                        return self._row
+
+                class QAbstractListModel:
+                    def __init__(self, parent=None):
+                        self.dataChanged = _Signal()
+
+                    def index(self, row, column=0, parent=None):
+                        return QModelIndex(row)
+
+                    def flags(self, index):
+                        return 0
+
+                class QSortFilterProxyModel:
+                    """Source rows accepted by filterAcceptsRow()."""
+                    def __init__(self, parent=None):
+                        self._source = None
+                        self._rows = []
+
+                    def setSourceModel(self, model):
+                        self._source = model
+                        self.invalidateFilter()
+
+                    def sourceModel(self):
+                        return self._source
+
+                    def invalidateFilter(self):
+                        self._rows = [
+                            row for row in range(self._source.rowCount())
+                            if self.filterAcceptsRow(row, QModelIndex())
+                        ]
+
+                    def filterAcceptsRow(self, row, parent):
+                        return True
+
+                    def rowCount(self, parent=None):
+                        return len(self._rows)
+
+                    def index(self, row, column=0, parent=None):
+                        return QModelIndex(row)
+
+                    def mapToSource(self, index):
+                        return QModelIndex(self._rows[index.row()])
+
+                class QTimer:
+                    """Timer stub; ``timeout`` never fires without Qt."""
+                    def __init__(self, parent=None):
+                        self.timeout = _Signal()
+
+                    def setSingleShot(self, single_shot):
+                        pass
+
+                    def setInterval(self, msec):
+                        pass
+
+                    def start(self, msec=None):
+                        pass
+
+                    def stop(self):
+                        pass
+
+                class QProgressDialog:
+                    """Progress stub; never shown and never cancelled."""
+                    def __init__(self, label="", cancel_text="", minimum=0,
+                                 maximum=100, parent=None):
+                        pass
+
+                    def setWindowTitle(self, title): pass
+                    def setWindowModality(self, modality): pass
+                    def setMinimumDuration(self, msec): pass
+                    def setAutoClose(self, enabled): pass
+                    def setAutoReset(self, enabled): pass
+                    def setLabelText(self, text): pass
+                    def setValue(self, value): pass
+                    def wasCanceled(self): return False
+                    def show(self): pass
+                    def close(self): pass
+
+                class QApplication:
+                    @staticmethod
+                    def processEvents():
+                        pass
+
+                class QDialogButtonBox:
+                    class StandardButton:
+                        Ok = 1024
+                        Cancel = 4194304
+
+                    def __init__(self, buttons=0):
+                        pass
+
+                    @property
+                    def accepted(self):
+                        return _Signal()
+
+                    @property
+                    def rejected(self):
+                        return _Signal()
+
+                class QCheckBox:
+                    def __init__(self, text=""):
+                        self._checked = False
+
+                    def isChecked(self):
+                        return self._checked
+
+                    @property
+                    def clicked(self):
+                        return _Signal()
+
+                    def setEnabled(self, enabled):
+                        pass
+
+                class QLineEdit:
+                    def __init__(self, parent=None):
+                        pass
+
+                    def text(self):
+                        return ""
+
+                    @property
+                    def textChanged(self):
+                        return _Signal()
+
+                class QTabWidget:
+                    def __init__(self, parent=None): pass
+                    def addTab(self, widget, label): pass
+
+                class QDoubleSpinBox:
+                    def __init__(self, parent=None):
+                        self._value = 0.0
+                    def setRange(self, min_val, max_val): pass
+                    def setDecimals(self, decimals): pass
+                    def setSingleStep(self, step): pass
+                    def setValue(self, value): self._value = value
+                    def value(self): return self._value
+                    def setEnabled(self, enabled): pass
+
+                class QHBoxLayout:
+                    def __init__(self, parent=None): pass
+                    def addWidget(self, widget): pass
+
+                class QFormLayout:
+                    def __init__(self, parent=None): pass
+                    def addRow(self, *args): pass
+
+                class QWidget:
+                    def __init__(self, parent=None): pass
+                    def setLayout(self, layout): pass
+
+                class QIcon:
+                    pass
+
+                ITEM_IS_SELECTABLE = 1
+                ITEM_IS_USER_CHECKABLE = 16
+                ITEM_IS_ENABLED = 32
+                DISPLAY_ROLE = 0
+                CHECK_STATE_ROLE = 10
+                USER_ROLE = 256
+                CHECKED = 2
+                UNCHECKED = 0
+                WINDOW_MODAL = 1
+    return locals()
+
+
+def _load_qt():
+    """Publish the Qt binding's names as module globals, once."""
+    if "QDialog" not in globals():
+        globals().update(_import_qt())
+
+# ---------------------------------------------------------------------------
+# Constants
+# ---------------------------------------------------------------------------
+
+PLUGIN_NAME = "PBR Json Generator"
+SKIP_KEYWORDS = ("texgen", "dyndolod")
+PBR_TEX_REL = Path("Textures") / "PBR"
+PATCHER_DIR = "PBRNifPatcher"
+RMAOS_SUFFIX = "rmaos"
+# Companion textures probed next to every ``*_rmaos.dds`` (``<base>_g.dds``).
+COMPANION_SUFFIXES = ("g", "f", "p", "s", "cnr")
+# The diffuse (no suffix) and normal map next to it, only read to check the
+# set's DDS headers against (see _check_texture_set).
+REFERENCE_SUFFIXES = ("", "n")
+# Magic, DDS_HEADER and the DX10 extension: all a header check reads.
+DDS_HEADER_SIZE = 148
+# Texture analysis reads the first mip level at most this many texels on a
+# side, and skips textures whose chosen level is larger than this in bytes.
+ANALYSIS_MIP_SIZE = 128
+ANALYSIS_MAX_BYTES = 1 << 20
+# Brightest a glow map's endpoint may be (0..1) and still count as black.
+GLOW_BLACK_LEVEL = 0.02
+OUTPUT_MOD_NAME = "PBR JSON Output"
+EXISTING_OUTPUT_MOD_NAME = "PBR Existing JSON Output"
+# Runs write into "<output mod>.staging", which then replaces the output mod;
+# the replaced one is kept as "<output mod>.previous".  Both live in
+# WORK_DIR_NAME beside the mods folder, where MO2 does not list them as mods.
+STAGING_SUFFIX = ".staging"
+PREVIOUS_SUFFIX = ".previous"
+WORK_DIR_NAME = "pbr_json_generator"
+DISCOVERY_CACHE_VERSION = 1
+# Per-mod record of generated outputs, kept next to its PBRNifPatcher folder
+# (not inside it, where PBRNifPatcher would read it as a config).
+MANIFEST_NAME = "generation_manifest.json"
+MANIFEST_VERSION = 1
+# JSON files per job handed to an update-mode worker process.
+UPDATE_BATCH_SIZE = 256
+# Output styles for written JSONs: the historical 4-space indent, or no
+# whitespace at all (about a third of the size).
+JSON_STYLES = ("indented", "compact")
+# What one generated JSON covers: a texture, a texture directory or a mod.
+OUTPUT_GRANULARITIES = ("texture", "directory", "mod")
+# Buffered log lines per mod before they are flushed to its log file.
+LOG_FLUSH_LINES = 1000
+# orjson reads integers beyond 64 bits as floats; such input goes to the
+# stdlib parser instead (20+ digit runs, which also catches long fractions).
+_LONG_NUMBER = re.compile(rb"\d{20}")
+# Quiet period after the last keystroke before the mod list is filtered.
+SEARCH_DEBOUNCE_MS = 150
+# Progress dialog resolution and how often the UI thread polls the worker.
+PROGRESS_STEPS = 1000
+PROGRESS_POLL_SECONDS = 0.05
+# Rows in the profiling reports written by ``_profiling``.
+PROFILE_TOP_FUNCTIONS = 40
+PROFILE_TOP_ALLOCATIONS = 25
+META_INI_CONTENT = (
+    "[General]\n"
+    "managed=false\n"
+    "version=1.0.0\n"
+    "modid=0\n"
+    "category=0\n"
+)
+
+
+# ---------------------------------------------------------------------------
+# Instrumentation
+# ---------------------------------------------------------------------------
+
+class _PhaseTimer:
+    __slots__ = ("metrics", "name", "start")
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.add_time(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class _Metrics:
+    """Phase timers and counters for one mod or one whole run.
+
+    Each unit of work owns its instance (so no locking is needed) and the
+    run merges them at the end.  Phase times of concurrent units add up, so
+    they can exceed the wall-clock ``total``.
+    """
+
+    __slots__ = ("phases", "counters")
+    enabled = True
+
+    def __init__(self):
+        self.phases = {}      # name -> [seconds, calls]
+        self.counters = {}    # name -> int
+
+    def phase(self, name: str):
+        return _PhaseTimer(self, name)
+
+    def add_time(self, name: str, seconds: float, calls: int = 1):
+        entry = self.phases.get(name)
+        if entry is None:
+            self.phases[name] = [seconds, calls]
+        else:
+            entry[0] += seconds
+            entry[1] += calls
+
+    def count(self, name: str, amount: int = 1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def merge(self, other):
+        for name, (seconds, calls) in other.phases.items():
+            self.add_time(name, seconds, calls)
+        for name, amount in other.counters.items():
+            self.count(name, amount)
+
+    def report_lines(self) -> list:
+        lines = ["", "--- Timings ---"]
+        for name, (seconds, calls) in self.phases.items():
+            lines.append(f"{name + ':':<14} {seconds:9.3f}s  ({calls} calls)")
+        if self.counters:
+            lines.append("--- Counters ---")
+            for name, amount in self.counters.items():
+                lines.append(f"{name + ':':<20} {amount}")
+        return lines
+
+
+class _NullMetrics:
+    """Stand-in used when instrumentation is off; every call is a no-op."""
+
+    __slots__ = ()
+    enabled = False
+    _PHASE = contextlib.nullcontext()
+
+    def phase(self, name):
+        return self._PHASE
+
+    def add_time(self, name, seconds, calls=1):
+        pass
+
+    def count(self, name, amount=1):
+        pass
+
+    def merge(self, other):
+        pass
+
+    def report_lines(self):
+        return []
+
+
+_NULL_METRICS = _NullMetrics()
+
+
+def _new_metrics(enabled: bool):
+    return _Metrics() if enabled else _NULL_METRICS
+
+
+class _Progress:
+    """Progress and cancellation shared by a background run and its dialog.
+
+    Engines report mods and files from any worker thread; the UI thread
+    only reads.  Cancellation is cooperative: engines check
+    :attr:`cancelled` between files, so no file is left half written.
+    """
+
+    def __init__(self, mods_total: int = 0):
+        self._lock = threading.Lock()
+        self._cancel = threading.Event()
+        self.mods_total = mods_total
+        self.mods_started = 0
+        self.mods_done = 0
+        self.files_known = 0
+        self.files_done = 0
+        self.current = ""
+        self.started = time.perf_counter()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def begin_mod(self, name: str, files: int):
+        with self._lock:
+            self.mods_started += 1
+            self.files_known += files
+            self.current = name
+
+    def advance(self, files: int = 1):
+        with self._lock:
+            self.files_done += files
+
+    def end_mod(self):
+        with self._lock:
+            self.mods_done += 1
+
+    def _estimate(self):
+        """Return ``(fraction, files_total_estimate, files_per_sec, eta)``."""
+        with self._lock:
+            started, known = self.mods_started, self.files_known
+            done = self.files_done
+            mods_done, mods_total = self.mods_done, self.mods_total
+        elapsed = time.perf_counter() - self.started
+        rate = done / elapsed if elapsed > 0 else 0.0
+        # Mods not scanned yet are assumed to be as big as the average.
+        total = known
+        if 0 < started < mods_total:
+            total = known * mods_total / started
+        if total:
+            fraction = min(done / total, 1.0)
+        else:
+            fraction = mods_done / mods_total if mods_total else 0.0
+        eta = (total - done) / rate if rate and total > done else None
+        return fraction, total, rate, eta
+
+    def fraction(self) -> float:
+        return self._estimate()[0]
+
+    def describe(self) -> str:
+        """Multi-line status for the progress dialog."""
+        if self.cancelled:
+            return "Cancelling after the current files..."
+        _, total, rate, eta = self._estimate()
+        lines = [
+            f"Mod {max(self.mods_started, 1)} of {self.mods_total}: "
+            f"{self.current}",
+            f"{self.files_done} of ~{int(total)} files "
+            f"({rate:.0f} files/s)",
+        ]
+        if eta is not None:
+            minutes, seconds = divmod(int(eta + 0.5), 60)
+            lines.append(f"About {minutes}:{seconds:02d} remaining")
+        return "\n".join(lines)
+
+
+class _NullProgress:
+    """Stand-in for runs without a progress dialog; never cancelled."""
+
+    __slots__ = ()
+    cancelled = False
+
+    def begin_mod(self, name, files):
+        pass
+
+    def advance(self, files=1):
+        pass
+
+    def end_mod(self):
+        pass
+
+
+_NULL_PROGRESS = _NullProgress()
+
+
+@contextlib.contextmanager
+def _profiling(out_dir: Path, enabled: bool = True):
+    """Run the body under cProfile and tracemalloc, then dump the results.
+
+    Writes ``profile.prof`` (for ``pstats``/snakeviz), ``profile.txt`` with
+    the top functions by cumulative time and ``allocations.txt`` with the
+    peak traced memory and the largest allocation sites still alive at the
+    end.  Only the calling thread is profiled, so callers run serially
+    while profiling.  Does nothing unless *enabled*.
+    """
+    if not enabled:
+        yield
+        return
+
+    import cProfile
+    import tracemalloc
+
+    started_tracing = not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        _, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+        ))
+        if started_tracing:
+            tracemalloc.stop()
+        _write_profile(out_dir, profiler, snapshot, peak)
+
+
+def _write_profile(out_dir: Path, profiler, snapshot, peak: int):
+    import pstats
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    # The reports of an earlier run may be hardlinked into the previous
+    # output (see _staged_output); write new files rather than into those.
+    for name in ("profile.prof", "profile.txt", "allocations.txt"):
+        try:
+            (out_dir / name).unlink()
+        except FileNotFoundError:
+            pass
+    profiler.dump_stats(str(out_dir / "profile.prof"))
+
+    with open(out_dir / "profile.txt", "w", encoding="utf-8") as f:
+        stats = pstats.Stats(profiler, stream=f)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE)
+        stats.print_stats(PROFILE_TOP_FUNCTIONS)
+
+    stats = snapshot.statistics("lineno")
+    lines = [
+        f"Peak traced memory: {peak / 1024:.1f} KiB",
+        f"Live at end:        "
+        f"{sum(stat.size for stat in stats) / 1024:.1f} KiB",
+        "",
+        f"Top {PROFILE_TOP_ALLOCATIONS} allocation sites:",
+    ]
+    for stat in stats[:PROFILE_TOP_ALLOCATIONS]:
+        frame = stat.traceback[0]
+        lines.append(
+            f"{stat.size / 1024:10.1f} KiB  {stat.count:8} blocks  "
+            f"{frame.filename}:{frame.lineno}"
+        )
+    _write_log(out_dir / "allocations.txt", lines)
+
+
+# ---------------------------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------------------------
+
+def _rename_texture(texture_str: str):
+    """Strip a trailing ``_d`` diffuse suffix and return the renamed path.
+
+    Returns *None* when the texture does not end with ``_d``.
+    """
+    if texture_str.endswith("_d"):
+        return texture_str[:-2]
+    return None
+
+
+class TextureSet:
+    """One ``*_rmaos.dds`` texture plus the companions found next to it.
+
+    *files* maps a lower-case suffix (``"rmaos"``, ``"g"``, ``"cnr"``, ...)
+    to the :class:`os.DirEntry` found inside *directory*, so companion
+    lookups are answered from memory instead of with one ``exists()`` call
+    each.
+    """
+
+    __slots__ = ("directory", "rel_dir", "base_name", "files")
+
+    def __init__(self, directory: Path, rel_dir: Path, base_name: str,
+                 files: dict):
+        self.directory = directory
+        self.rel_dir = rel_dir
+        self.base_name = base_name
+        self.files = files
+
+    def has(self, suffix: str) -> bool:
+        return suffix in self.files
+
+    def path(self, suffix: str) -> Path:
+        return self.directory / self.files[suffix].name
+
+    def stamps(self) -> dict:
+        """Return ``{suffix: [mtime_ns, size]}`` for every file in the set.
+
+        Uses the stat data cached on the directory entries, which Windows
+        fills in from the directory listing itself.
+        """
+        stamps = {}
+        for suffix, entry in self.files.items():
+            st = entry.stat()
+            stamps[suffix] = [st.st_mtime_ns, st.st_size]
+        return stamps
+
+    @property
+    def texture_path(self) -> str:
+        """Backslash-separated texture path as written to JSON."""
+        return str(self.rel_dir / self.base_name).replace("/", "\\")
+
+
+def _scan_texture_sets(pbr_folder: Path) -> list:
+    """Walk *pbr_folder* once and return a :class:`TextureSet` per rmaos file.
+
+    Every directory is listed a single time with :func:`os.scandir` and its
+    ``.dds`` files are grouped by base name and suffix case-insensitively,
+    so ``_RMAOS.DDS`` / ``_G.dds`` spellings are matched as well.  Besides
+    the companions, a set holds the diffuse (suffix ``""``) and normal map
+    (``"n"``) when they sit next to it.  Sets are ordered by directory
+    (depth-first, sorted) and then by base name.
+    """
+    rmaos_tail = f"_{RMAOS_SUFFIX}"
+    sets = []
+    pending = [(pbr_folder, Path())]
+    while pending:
+        directory, rel_dir = pending.pop()
+        try:
+            with os.scandir(directory) as it:
+                entries = list(it)
+        except OSError:
+            continue
+
+        stems = {}
+        subdirs = []
+        for entry in entries:
+            name = entry.name
+            if entry.is_dir():
+                subdirs.append(name)
+            elif name[-4:].lower() == ".dds":
+                stems[name[:-4].lower()] = entry
+
+        for stem in sorted(stems):
+            if not stem.endswith(rmaos_tail):
+                continue
+            rmaos = stems[stem]
+            base = stem[: -len(rmaos_tail)]
+            files = {RMAOS_SUFFIX: rmaos}
+            for suffix in COMPANION_SUFFIXES + REFERENCE_SUFFIXES:
+                companion = stems.get(f"{base}_{suffix}" if suffix else base)
+                if companion is not None:
+                    files[suffix] = companion
+            sets.append(TextureSet(
+                directory, rel_dir, rmaos.name[: -len(rmaos_tail) - 4], files
+            ))
+
+        for name in sorted(subdirs, key=str.lower, reverse=True):
+            pending.append((directory / name, rel_dir / name))
+    return sets
+
+
+# Pixel formats by legacy FourCC and by DXGI_FORMAT (DX10 extension), and
+# the channels each one stores.
+_DDS_FOURCC_FORMATS = {
+    b"DXT1": "BC1", b"DXT2": "BC2", b"DXT3": "BC2", b"DXT4": "BC3",
+    b"DXT5": "BC3", b"ATI1": "BC4", b"BC4U": "BC4", b"BC4S": "BC4",
+    b"ATI2": "BC5", b"BC5U": "BC5", b"BC5S": "BC5",
+}
+_DXGI_FORMATS = {
+    28: "RGBA8", 29: "RGBA8", 49: "RG8", 61: "R8", 71: "BC1", 72: "BC1",
+    74: "BC2", 75: "BC2", 77: "BC3", 78: "BC3", 80: "BC4", 81: "BC4",
+    83: "BC5", 84: "BC5", 87: "BGRA8", 88: "BGRX8", 91: "BGRA8",
+    93: "BGRX8", 95: "BC6H", 96: "BC6H", 98: "BC7", 99: "BC7",
+}
+_DDS_CHANNELS = {
+    "BC1": 3, "BC2": 4, "BC3": 4, "BC4": 1, "BC5": 2, "BC6H": 3, "BC7": 4,
+    "RGBA8": 4, "BGRA8": 4, "RGBX8": 3, "BGRX8": 3, "RGB8": 3, "BGR8": 3,
+    "RG8": 2, "R8": 1, "L8": 1, "LA8": 2,
+}
+# Fewest channels a map needs: _rmaos packs roughness, metallic and AO,
+# a normal map at least X and Y.
+_MIN_CHANNELS = {RMAOS_SUFFIX: 3, "n": 2}
+_DDPF_ALPHAPIXELS = 0x1
+_DDPF_FOURCC = 0x4
+_DDPF_RGB = 0x40
+_DDPF_LUMINANCE = 0x20000
+
+
+class _DdsInfo:
+    """Size, mip count and pixel format from one DDS header.
+
+    *offset* is where the pixel data of the first mip level starts.
+    """
+
+    __slots__ = ("width", "height", "mips", "format", "offset")
+
+    def __init__(self, width: int, height: int, mips: int, fmt: str,
+                 offset: int = 128):
+        self.width = width
+        self.height = height
+        self.mips = mips
+        self.format = fmt
+        self.offset = offset
+
+    @property
+    def channels(self):
+        """Channels the format stores, or *None* when it is not known."""
+        return _DDS_CHANNELS.get(self.format)
+
+    @property
+    def block_compressed(self) -> bool:
+        return self.format.startswith("BC")
+
+
+def _read_dds_header(path: Path) -> _DdsInfo:
+    """Parse the first :data:`DDS_HEADER_SIZE` bytes of a DDS file.
+
+    Raises :class:`ValueError` when the file is not a usable DDS texture.
+    """
+    with open(path, "rb") as f:
+        head = f.read(DDS_HEADER_SIZE)
+    if not head:
+        raise ValueError("file is empty")
+    if (len(head) < 128 or head[:4] != b"DDS "
+            or struct.unpack_from("<I", head, 4)[0] != 124):
+        raise ValueError("not a DDS texture")
+    height, width = struct.unpack_from("<2I", head, 12)
+    mips = struct.unpack_from("<I", head, 28)[0] or 1
+    pf_flags, fourcc, bits, red_mask = struct.unpack_from(
+        "<I4s2I", head, 80
+    )
+    if not width or not height:
+        raise ValueError("header has no width or height")
+
+    offset = 128
+    if pf_flags & _DDPF_FOURCC:
+        if fourcc == b"DX10":
+            if len(head) < DDS_HEADER_SIZE:
+                raise ValueError("DX10 header is truncated")
+            dxgi = struct.unpack_from("<I", head, 128)[0]
+            fmt = _DXGI_FORMATS.get(dxgi, f"DXGI format {dxgi}")
+            offset = DDS_HEADER_SIZE
+        else:
+            fmt = _DDS_FOURCC_FORMATS.get(
+                fourcc, fourcc.decode("latin-1").strip("\0 ")
+            )
+    elif pf_flags & _DDPF_RGB and bits in (24, 32) and red_mask in (
+        0xFF, 0xFF0000
+    ):
+        # The red mask tells byte order: RGB(A) or the more common BGR(A).
+        order = "RGB" if red_mask == 0xFF else "BGR"
+        if bits == 24:
+            fmt = f"{order}8"
+        else:
+            fmt = f"{order}{'A' if pf_flags & _DDPF_ALPHAPIXELS else 'X'}8"
+    elif pf_flags & _DDPF_RGB:
+        fmt = f"{bits}-bit RGB"
+    elif pf_flags & _DDPF_LUMINANCE:
+        fmt = "LA8" if pf_flags & _DDPF_ALPHAPIXELS else "L8"
+    else:
+        fmt = "unknown format"
+    return _DdsInfo(width, height, mips, fmt, offset)
+
+
+def _dds_header(path: Path, metrics=_NULL_METRICS):
+    """Return ``(info, error)`` for the DDS file at *path*.
+
+    *error* describes why the file is unusable, else *None*.
+    """
+    info = error = None
+    with metrics.phase("dds"):
+        try:
+            info = _read_dds_header(path)
+        except (OSError, ValueError) as exc:
+            error = str(exc)
+    metrics.count("dds_read")
+    return info, error
+
+
+def _check_texture_set(tex_set, metrics=_NULL_METRICS):
+    """Validate the DDS headers of every file in *tex_set*.
+
+    A companion that cannot be read as a DDS texture (an empty ``_g.dds``,
+    say) is reported and ignored, so its feature is not switched on.  Each
+    map must also match the aspect ratio of the diffuse (or, without one,
+    the normal map), keep mipmaps when that has them, use a block size its
+    block-compressed format allows and, for the ``_rmaos`` and normal map,
+    store enough channels.  Returns ``(ignored_suffixes, problems,
+    headers)``, *headers* mapping the suffix of every readable file to its
+    :class:`_DdsInfo`.
+    """
+    headers = {}
+    ignored = set()
+    problems = []
+
+    def shown(suffix):
+        return (tex_set.rel_dir / tex_set.files[suffix].name).as_posix()
+
+    for suffix in tex_set.files:
+        info, error = _dds_header(tex_set.path(suffix), metrics)
+        if error is not None:
+            problems.append(f"{shown(suffix)}: {error}")
+            if suffix in COMPANION_SUFFIXES:
+                ignored.add(suffix)
+        else:
+            headers[suffix] = info
+
+    ref_suffix = next((s for s in REFERENCE_SUFFIXES if s in headers), None)
+    ref = headers.get(ref_suffix)
+    for suffix, info in headers.items():
+        size = f"{info.width}x{info.height}"
+        if info.block_compressed and (info.width % 4 or info.height % 4):
+            problems.append(
+                f"{shown(suffix)}: {size} is not a multiple of 4 "
+                f"as {info.format} requires"
+            )
+        need = _MIN_CHANNELS.get(suffix)
+        if need and info.channels is not None and info.channels < need:
+            problems.append(
+                f"{shown(suffix)}: {info.format} stores {info.channels} "
+                f"channel(s), {need} needed"
+            )
+        if ref is None or suffix == ref_suffix:
+            continue
+        if info.width * ref.height != info.height * ref.width:
+            problems.append(
+                f"{shown(suffix)}: {size} does not match the aspect ratio "
+                f"of {shown(ref_suffix)} ({ref.width}x{ref.height})"
+            )
+        if info.mips == 1 and ref.mips > 1:
+            problems.append(
+                f"{shown(suffix)}: no mipmaps, {shown(ref_suffix)} has "
+                f"{ref.mips}"
+            )
+    return ignored, problems, headers
+
+
+# Texture analysis (optional, needs NumPy): per-texture statistics from the
+# block endpoints of one small mip level, never fully decompressed.
+# Bytes per 4x4 block of the block-compressed formats.
+_BLOCK_BYTES = {
+    "BC1": 8, "BC4": 8, "BC2": 16, "BC3": 16, "BC5": 16, "BC6H": 16,
+    "BC7": 16,
+}
+# Uncompressed formats: bytes per pixel and the byte holding R, G, B and A
+# (None when the format has no such channel).
+_PIXEL_LAYOUTS = {
+    "RGBA8": (4, (0, 1, 2, 3)), "BGRA8": (4, (2, 1, 0, 3)),
+    "RGBX8": (4, (0, 1, 2, None)), "BGRX8": (4, (2, 1, 0, None)),
+    "RGB8": (3, (0, 1, 2, None)), "BGR8": (3, (2, 1, 0, None)),
+    "RG8": (2, (0, 1, None, None)), "R8": (1, (0, None, None, None)),
+    "L8": (1, (0, 0, 0, None)), "LA8": (2, (0, 0, 0, 1)),
+}
+# BC7 modes: subsets, partition, rotation and index-selection bits, then
+# bits per colour and per alpha endpoint value.
+_BC7_MODES = (
+    (3, 4, 0, 0, 4, 0),
+    (2, 6, 0, 0, 6, 0),
+    (3, 6, 0, 0, 5, 0),
+    (2, 6, 0, 0, 7, 0),
+    (1, 0, 2, 1, 5, 6),
+    (1, 0, 2, 0, 7, 8),
+    (1, 0, 0, 0, 7, 7),
+    (2, 6, 0, 0, 5, 5),
+)
+
+
+def _load_numpy():
+    """Import NumPy for texture analysis; *None* when it is not installed."""
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+def _level_size(fmt: str, width: int, height: int):
+    """Bytes of one mip level, or *None* for a format of unknown layout."""
+    block = _BLOCK_BYTES.get(fmt)
+    if block is not None:
+        return max(1, (width + 3) // 4) * max(1, (height + 3) // 4) * block
+    layout = _PIXEL_LAYOUTS.get(fmt)
+    return None if layout is None else width * height * layout[0]
+
+
+def _analysis_level(info: _DdsInfo):
+    """Return ``(offset, size)`` of the mip level analysed for *info*.
+
+    That is the first level at most :data:`ANALYSIS_MIP_SIZE` on its
+    longer side, else the smallest one stored; *None* when the format's
+    layout is unknown or that level exceeds :data:`ANALYSIS_MAX_BYTES`.
+    """
+    offset, width, height = info.offset, info.width, info.height
+    for level in range(info.mips):
+        size = _level_size(info.format, width, height)
+        if size is None:
+            return None
+        if max(width, height) <= ANALYSIS_MIP_SIZE or level == info.mips - 1:
+            return (offset, size) if size <= ANALYSIS_MAX_BYTES else None
+        offset += size
+        width, height = max(1, width // 2), max(1, height // 2)
+    return None
+
+
+def _bit_fields(np, bits, start: int, count: int, width: int):
+    """Read *count* consecutive *width*-bit fields from every row of *bits*
+    (one bit per column, least significant first).
+    """
+    fields = bits[:, start:start + count * width].reshape(-1, count, width)
+    return fields @ (1 << np.arange(width))
+
+
+def _rgb565(np, colors):
+    return np.stack((
+        (colors >> 11) / 31.0,
+        ((colors >> 5) & 63) / 63.0,
+        (colors & 31) / 31.0,
+    ), axis=-1)
+
+
+def _bc7_endpoints(np, blocks):
+    """Endpoints of BC7 *blocks* as an ``(n, 6, 4)`` RGBA array.
+
+    Modes with fewer than six endpoints are padded with NaN; P-bits are
+    ignored, which shifts values by less than one step of their precision.
+    Blocks of the reserved mode decode to transparent black.
+    """
+    bits = np.unpackbits(blocks, axis=1, bitorder="little")
+    ends = np.full((len(blocks), 6, 4), np.nan)
+    ends[:, :2] = 0.0
+    head = bits[:, :8]
+    modes = np.where(head.any(axis=1), head.argmax(axis=1), -1)
+    for mode, (subsets, pbits, rbits, ibits, cbits, abits) in enumerate(
+        _BC7_MODES
+    ):
+        selected = modes == mode
+        if not selected.any():
+            continue
+        mode_bits = bits[selected]
+        count = 2 * subsets
+        pos = mode + 1 + pbits + rbits + ibits
+        values = np.empty((len(mode_bits), count, 4))
+        for channel in range(3):
+            values[:, :, channel] = _bit_fields(
+                np, mode_bits, pos, count, cbits
+            ) / ((1 << cbits) - 1)
+            pos += count * cbits
+        if abits:
+            values[:, :, 3] = _bit_fields(
+                np, mode_bits, pos, count, abits
+            ) / ((1 << abits) - 1)
+        else:
+            values[:, :, 3] = 1.0
+        if rbits:
+            # Rotation swaps alpha with red, green or blue.
+            rotation = _bit_fields(np, mode_bits, mode + 1, 1, rbits)[:, 0]
+            for channel in range(3):
+                rotated = rotation == channel + 1
+                swapped = values[rotated][:, :, [3, channel]]
+                values[rotated, :, channel] = swapped[:, :, 0]
+                values[rotated, :, 3] = swapped[:, :, 1]
+        ends[selected, :count] = values
+        ends[selected, count:] = np.nan
+    return ends
+
+
+def _texture_endpoints(np, fmt: str, data: bytes):
+    """Return ``(endpoints, channels)`` for one mip level's *data*.
+
+    *endpoints* is an ``(n, k, 4)`` RGBA array in 0..1 holding each block's
+    endpoint colours (each pixel, for uncompressed formats) and *channels*
+    the RGBA indices the format stores.  ``(None, ())`` for formats that
+    are not analysed.
+    """
+    if fmt == "BC1":
+        blocks = np.frombuffer(data, "<u2").reshape(-1, 4)
+        ends = np.zeros((len(blocks), 2, 4))
+        ends[..., :3] = _rgb565(np, blocks[:, :2])
+        return ends, (0, 1, 2)
+    if fmt == "BC3":
+        blocks = np.frombuffer(data, np.uint8).reshape(-1, 16)
+        ends = np.empty((len(blocks), 2, 4))
+        ends[..., :3] = _rgb565(np, blocks[:, 8:12].copy().view("<u2"))
+        ends[..., 3] = blocks[:, :2] / 255.0
+        return ends, (0, 1, 2, 3)
+    if fmt == "BC4":
+        blocks = np.frombuffer(data, np.uint8).reshape(-1, 8)
+        ends = np.zeros((len(blocks), 2, 4))
+        ends[..., 0] = blocks[:, :2] / 255.0
+        return ends, (0,)
+    if fmt == "BC5":
+        blocks = np.frombuffer(data, np.uint8).reshape(-1, 16)
+        ends = np.zeros((len(blocks), 2, 4))
+        ends[..., 0] = blocks[:, 0:2] / 255.0
+        ends[..., 1] = blocks[:, 8:10] / 255.0
+        return ends, (0, 1)
+    if fmt == "BC7":
+        blocks = np.frombuffer(data, np.uint8).reshape(-1, 16)
+        return _bc7_endpoints(np, blocks), (0, 1, 2, 3)
+    layout = _PIXEL_LAYOUTS.get(fmt)
+    if layout is None:
+        return None, ()
+    size, sources = layout
+    pixels = np.frombuffer(data, np.uint8).reshape(-1, size)
+    ends = np.zeros((len(pixels), 1, 4))
+    channels = []
+    for channel, source in enumerate(sources):
+        if source is not None:
+            ends[:, 0, channel] = pixels[:, source] / 255.0
+            channels.append(channel)
+    return ends, tuple(channels)
+
+
+def _texture_stats(path: Path, info: _DdsInfo, metrics=_NULL_METRICS):
+    """Return statistics of the DDS file at *path*, or *None*.
+
+    Only the mip level chosen by :func:`_analysis_level` is read.  The
+    result holds ``mean`` (RGBA means in 0..1, *None* for channels the
+    format lacks) and ``coverage``, the share of blocks with an endpoint
+    brighter than :data:`GLOW_BLACK_LEVEL`.
+    """
+    np = _load_numpy()
+    stats = None
+    level = _analysis_level(info)
+    if np is not None and level is not None:
+        offset, size = level
+        with metrics.phase("analyse"):
+            try:
+                with open(path, "rb") as f:
+                    f.seek(offset)
+                    data = f.read(size)
+            except OSError:
+                data = b""
+            ends = None
+            if len(data) == size:
+                ends, channels = _texture_endpoints(np, info.format, data)
+            if ends is not None:
+                mean = [None] * 4
+                for channel in channels:
+                    mean[channel] = float(np.nanmean(ends[..., channel]))
+                colour = [channel for channel in channels if channel < 3]
+                peak = np.nanmax(ends[..., colour], axis=(1, 2))
+                stats = {
+                    "mean": mean,
+                    "coverage": float((peak > GLOW_BLACK_LEVEL).mean()),
+                }
+        metrics.count("textures_analysed")
+    return stats
+
+
+def _analyse_texture_set(tex_set, headers: dict, settings: dict,
+                         metrics=_NULL_METRICS):
+    """Derive per-entry adjustments from *tex_set*'s texture statistics.
+
+    *headers* are the set's DDS headers as :func:`_check_texture_set`
+    returns them, so no header is read twice.
+
+    The ``_rmaos`` means (roughness, metallic, AO, specular) clamp
+    ``roughness_scale`` so that the average roughness stays at most 1, and
+    a ``_g`` map with no block above :data:`GLOW_BLACK_LEVEL` counts as
+    black.  Returns ``(overrides, dark_glow, report)``, *report* being a
+    log line or *None* when nothing could be analysed.
+    """
+    stats = {}
+    for suffix in (RMAOS_SUFFIX, "g"):
+        info = headers.get(suffix)
+        if info is not None:
+            result = _texture_stats(tex_set.path(suffix), info, metrics)
+            if result is not None:
+                stats[suffix] = result
+    if not stats:
+        return {}, False, None
+
+    overrides = {}
+    parts = []
+    rmaos = stats.get(RMAOS_SUFFIX)
+    if rmaos is not None:
+        parts.extend(
+            f"{name} {value:.2f}"
+            for name, value in zip(
+                ("roughness", "metallic", "AO", "specular"), rmaos["mean"]
+            )
+            if value is not None
+        )
+        roughness = rmaos["mean"][0]
+        scale = settings.get("roughness_scale")
+        if (isinstance(scale, (int, float)) and roughness
+                and roughness * scale > 1):
+            overrides["roughness_scale"] = round(1 / roughness, 3)
+            parts.append(
+                f"roughness_scale clamped to {overrides['roughness_scale']}"
+            )
+    glow = stats.get("g")
+    dark_glow = glow is not None and glow["coverage"] == 0
+    if glow is not None:
+        parts.append(
+            f"glow covers {glow['coverage']:.0%}"
+            + (" (emissive off)" if dark_glow else "")
+        )
+    report = f"Analysed {tex_set.texture_path}: {', '.join(parts)}"
+    return overrides, dark_glow, report
+
+
+def _list_file_names(directory: Path) -> dict:
+    """Return ``{lower_name: name}`` for the files in *directory*.
+
+    A missing directory yields an empty mapping.
+    """
+    try:
+        with os.scandir(directory) as it:
+            return {
+                entry.name.lower(): entry.name
+                for entry in it if not entry.is_dir()
+            }
+    except OSError:
+        return {}
+
+
+def _json_style(value) -> str:
+    """Normalise the *json_style* setting; unknown values mean indented."""
+    value = str(value).strip().lower()
+    return value if value in JSON_STYLES else JSON_STYLES[0]
+
+
+def _output_granularity(value) -> str:
+    """Normalise the *output_granularity* setting; unknown means texture."""
+    value = str(value).strip().lower()
+    return value if value in OUTPUT_GRANULARITIES else OUTPUT_GRANULARITIES[0]
+
+
+def _loads_json(raw: bytes):
+    """Parse UTF-8 JSON bytes with orjson when available, else the stdlib.
+
+    orjson rejects ``NaN``/``Infinity`` literals and turns integers beyond
+    64 bits into floats; such input is handed to the stdlib parser so both
+    backends accept the same files and return the same values.
+    """
+    if orjson is not None and not _LONG_NUMBER.search(raw):
+        try:
+            return orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(raw.decode("utf-8"))
+
+
+def _dumps_json(data, style: str = "indented") -> bytes:
+    """Serialise *data* to UTF-8 bytes in the given output *style*.
+
+    The indented style always uses the stdlib encoder so its output stays
+    byte-identical to earlier releases.  The compact style uses orjson when
+    installed; payloads orjson cannot round-trip (``NaN`` becomes ``null``,
+    big integers raise) are re-encoded by the stdlib, so the parsed result
+    never depends on the backend.
+    """
+    if style == "compact":
+        if orjson is not None:
+            try:
+                payload = orjson.dumps(data)
+            except TypeError:
+                payload = None
+            if payload is not None and b"null" not in payload:
+                return payload
+        return json.dumps(
+            data, separators=(",", ":"), ensure_ascii=False
+        ).encode("utf-8")
+
+    text = json.dumps(data, indent=4)
+    if os.linesep != "\n":
+        # Match what text-mode json.dump() has always produced.
+        text = text.replace("\n", os.linesep)
+    return text.encode("utf-8")
+
+
+def _read_json(path: Path, metrics=_NULL_METRICS):
+    """Load a UTF-8 JSON file, recording read and parse time in *metrics*."""
+    with metrics.phase("read"):
+        with open(path, "rb") as f:
+            raw = f.read()
+    metrics.count("files_read")
+    metrics.count("bytes_read", len(raw))
+    with metrics.phase("parse"):
+        return _loads_json(raw)
+
+
+def _encode_text(text: str) -> bytes:
+    """Encode *text* the way a text-mode ``write_text`` would."""
+    return text.replace("\n", os.linesep).encode("utf-8")
+
+
+def _replace_file(path: Path, payload: bytes):
+    """Write *payload* to a temporary file and move it over *path*.
+
+    Readers never see a half-written file, and a *path* hardlinked to the
+    previous output (see :func:`_link_tree`) gets a new file instead of
+    changing the one both trees share.
+    """
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(payload)
+    os.replace(tmp, path)
+
+
+def _write_json_if_changed(path: Path, data, metrics=_NULL_METRICS,
+                           style: str = "indented") -> bool:
+    """Write *data* as JSON unless *path* already holds those bytes.
+
+    The payload is serialised in memory first (see :func:`_dumps_json` for
+    *style*); the existing file is only read when its size matches.
+    Skipping identical writes keeps mtimes stable for MO2's refresh and for
+    backup/sync tools.  The file is replaced, never rewritten in place (see
+    :func:`_replace_file`).  Returns *True* when the file was written.
+    """
+    with metrics.phase("serialise"):
+        payload = _dumps_json(data, style)
+    with metrics.phase("compare"):
+        metrics.count("stats")
+        try:
+            if os.stat(path).st_size == len(payload):
+                with open(path, "rb") as f:
+                    metrics.count("bytes_read", len(payload))
+                    if f.read() == payload:
+                        return False
+        except OSError:
+            pass
+    with metrics.phase("write"):
+        _replace_file(path, payload)
+    metrics.count("files_written")
+    metrics.count("bytes_written", len(payload))
+    return True
+
+
+class _LogSink:
+    """Buffered, incrementally flushed writer for one mod's log file.
+
+    Lines are joined with newlines (no trailing newline), as the logs have
+    always been written, and reach disk every ``LOG_FLUSH_LINES`` lines so
+    memory stays flat and a crash keeps everything up to the last flush.
+    The file is created on the first flush, or on :meth:`close`;
+    :meth:`discard` drops a log that turned out to have nothing to report.
+    Per-file lines go through :meth:`detail` and are dropped unless
+    *verbose*.
+    """
+
+    def __init__(self, path: Path, verbose: bool = True,
+                 flush_lines: int = LOG_FLUSH_LINES):
+        self.path = path
+        self.verbose = verbose
+        self.flush_lines = flush_lines
+        self._buffer = []
+        self._file = None
+        self._closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def write(self, line: str):
+        self._buffer.append(line)
+        if len(self._buffer) >= self.flush_lines:
+            self.flush()
+
+    def detail(self, line: str):
+        if self.verbose:
+            self.write(line)
+
+    def extend(self, lines):
+        for line in lines:
+            self.write(line)
+
+    def flush(self):
+        if self._closed or (not self._buffer and self._file is not None):
+            return
+        if self._file is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            try:
+                # Start a new file: the old log may be hardlinked into the
+                # previous output (see _staged_output).
+                self.path.unlink()
+            except FileNotFoundError:
+                pass
+            self._file = open(self.path, "w", encoding="utf-8")
+            text = "\n".join(self._buffer)
+        else:
+            text = "\n" + "\n".join(self._buffer)
+        self._buffer.clear()
+        self._file.write(text)
+        self._file.flush()
+
+    def close(self):
+        if self._closed:
+            return
+        self.flush()
+        self._file.close()
+        self._closed = True
+
+    def discard(self):
+        """Drop the log; removes the file if a flush already created it."""
+        if self._closed:
+            return
+        self._buffer.clear()
+        self._closed = True
+        if self._file is not None:
+            self._file.close()
+            try:
+                self.path.unlink()
+            except OSError:
+                pass
+
+
+class _DiscardingLogSink(_LogSink):
+    """Log sink of a dry run: accepts every line and keeps none."""
+
+    def flush(self):
+        self._buffer.clear()
+
+    def close(self):
+        self._buffer.clear()
+        self._closed = True
+
+
+class _DiskWriter:
+    """Where the engines' outputs go: straight to disk.
+
+    :class:`_Plan` offers the same methods but only records what would
+    change, so a dry run takes exactly the code path of a real one.
+    """
+
+    __slots__ = ()
+    dry_run = False
+
+    def mkdir(self, path: Path):
+        path.mkdir(parents=True, exist_ok=True)
+
+    def write_json(self, path: Path, data, metrics=_NULL_METRICS,
+                   style: str = "indented") -> bool:
+        return _write_json_if_changed(path, data, metrics, style)
+
+    def write_text(self, path: Path, text: str):
+        _replace_file(path, _encode_text(text))
+
+    def keep(self, path: Path):
+        """Note an output that is left alone without being compared."""
+
+    def remove(self, path: Path):
+        path.unlink()
+
+    def save_state(self, path: Path, data: dict):
+        _save_state(path, data)
+
+    def log(self, path: Path, verbose: bool = True):
+        return _LogSink(path, verbose)
+
+
+_DISK = _DiskWriter()
+
+
+def _unified_diff(old: bytes, new: bytes, name: str) -> list:
+    import difflib
+
+    return list(difflib.unified_diff(
+        old.decode("utf-8", "replace").splitlines(),
+        new.decode("utf-8", "replace").splitlines(),
+        f"a/{name}", f"b/{name}", lineterm="",
+    ))
+
+
+class _Plan:
+    """Dry-run writer: records what a run would change and writes nothing.
+
+    Outputs are compared with what is on disk and recorded as ``create``,
+    ``update`` (with a unified diff), ``unchanged`` or ``delete``; paths
+    are reported relative to *root*.  Generate mode's worker threads may
+    share one plan.
+    """
+
+    dry_run = True
+    ACTIONS = ("create", "update", "unchanged", "delete")
+
+    def __init__(self, root: Path):
+        self.root = root
+        self._lock = threading.Lock()
+        self._records = []
+
+    def _shown(self, path: Path) -> str:
+        try:
+            return path.relative_to(self.root).as_posix()
+        except ValueError:
+            return str(path)
+
+    def _record(self, path: Path, action: str, diff=()):
+        shown = self._shown(path)
+        with self._lock:
+            self._records.append((shown, action, diff))
+
+    def _write(self, path: Path, payload: bytes,
+               metrics=_NULL_METRICS) -> bool:
+        with metrics.phase("compare"):
+            metrics.count("stats")
+            try:
+                with open(path, "rb") as f:
+                    old = f.read()
+            except OSError:
+                old = None
+        if old is None:
+            self._record(path, "create")
+        elif old == payload:
+            self._record(path, "unchanged")
+            return False
+        else:
+            self._record(path, "update",
+                         _unified_diff(old, payload, self._shown(path)))
+        return True
+
+    def mkdir(self, path: Path):
+        pass
+
+    def write_json(self, path: Path, data, metrics=_NULL_METRICS,
+                   style: str = "indented") -> bool:
+        with metrics.phase("serialise"):
+            payload = _dumps_json(data, style)
+        return self._write(path, payload, metrics)
+
+    def write_text(self, path: Path, text: str):
+        self._write(path, _encode_text(text))
+
+    def keep(self, path: Path):
+        self._record(path, "unchanged")
+
+    def remove(self, path: Path):
+        os.stat(path)  # raises FileNotFoundError like unlink() would
+        self._record(path, "delete")
+
+    def save_state(self, path: Path, data: dict):
+        pass
+
+    def log(self, path: Path, verbose: bool = True):
+        return _DiscardingLogSink(path, verbose)
+
+    def counts(self) -> dict:
+        counts = dict.fromkeys(self.ACTIONS, 0)
+        for _, action, _ in self._records:
+            counts[action] += 1
+        return counts
+
+    def report_lines(self) -> list:
+        """The plan: totals, then every output path with its action."""
+        counts = self.counts()
+        lines = [f"Dry run of {self.root}: nothing was written.", ""]
+        lines.extend(
+            f"{action.capitalize() + ':':<11}{counts[action]}"
+            for action in self.ACTIONS
+        )
+        lines.append("")
+        for shown, action, diff in sorted(
+            self._records, key=lambda record: record[0].lower()
+        ):
+            lines.append(f"{action:<10}{shown}")
+            lines.extend(diff)
+        return lines
+
+
+def _extract_entries(data):
+    """Return ``(entries_list, is_wrapped_in_dict)`` or ``(None, None)``.
+
+    Handles both ``{"entries": [...]}`` and plain ``[...]`` formats.
+    """
+    if isinstance(data, dict) and "entries" in data:
+        entries = data["entries"]
+        if isinstance(entries, list) and entries:
+            return entries, True
+    elif isinstance(data, list) and data:
+        return data, False
+    return None, None
+
+
+def _build_rmaos_index(pbr_folder: Path):
+    """Build the ``*_rmaos.dds`` lookups used by update mode.
+
+    Returns ``(index, by_name)``.  *index* maps a normalised stem to its
+    :class:`TextureSet`; keys are lower-cased, forward-slash paths relative
+    to *pbr_folder* with the ``_rmaos.dds`` suffix removed (e.g.
+    ``landscape/dirt``).  *by_name* maps the last path component of each key
+    (``dirt``) to every key sharing it, ordered by :func:`_candidate_order`
+    so the first candidate is the deterministic filename-fallback match.
+    Both are filled in the same directory walk.
+    """
+    index = {}
+    by_name = {}
+    for tex_set in _scan_texture_sets(pbr_folder):
+        key = tex_set.texture_path.replace("\\", "/").lower()
+        index[key] = tex_set
+        by_name.setdefault(key.rsplit("/", 1)[-1], []).append(key)
+    for candidates in by_name.values():
+        if len(candidates) > 1:
+            candidates.sort(key=_candidate_order)
+    return index, by_name
+
+
+def _build_global_index(mod_folders, metrics=_NULL_METRICS):
+    """Build update mode's lookups over several mods' ``Textures/PBR``.
+
+    *mod_folders* are in MO2 priority order, lowest first, so a texture
+    provided by several mods resolves to the winning mod's spelling of its
+    path.  Returns ``(texture_index, by_name)`` where *texture_index* maps a
+    normalised stem to its texture path and *by_name* is the basename
+    multimap described in :func:`_build_rmaos_index`.
+    """
+    texture_index = {}
+    with metrics.phase("index"):
+        for mod_folder in mod_folders:
+            for tex_set in _scan_texture_sets(mod_folder / PBR_TEX_REL):
+                texture_path = tex_set.texture_path
+                texture_index[texture_path.replace("\\", "/").lower()] = (
+                    texture_path
+                )
+    by_name = {}
+    for key in texture_index:
+        by_name.setdefault(key.rsplit("/", 1)[-1], []).append(key)
+    for candidates in by_name.values():
+        if len(candidates) > 1:
+            candidates.sort(key=_candidate_order)
+    metrics.count("rmaos_indexed", len(texture_index))
+    return texture_index, by_name
+
+
+def _read_modlist(path: Path) -> list:
+    """Return the enabled mod names of an MO2 ``modlist.txt``, lowest
+    priority first.
+
+    MO2 lists mods highest priority first, prefixing enabled ones with
+    ``+``; disabled (``-``) and unmanaged (``*``) lines and comments are
+    skipped.
+    """
+    names = []
+    with open(path, "r", encoding="utf-8-sig") as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith("+"):
+                names.append(line[1:])
+    names.reverse()
+    return names
+
+
+def _candidate_order(key: str):
+    """Sort key for filename-fallback candidates: shallowest path first,
+    then alphabetical, so ambiguous matches always resolve the same way.
+    """
+    return key.count("/"), key
+
+
+# ---------------------------------------------------------------------------
+# Mod discovery
+# ---------------------------------------------------------------------------
+
+def _load_state(path: Path) -> dict:
+    """Read a JSON state file written by :func:`_save_state`.
+
+    Missing or unreadable files yield an empty dict.
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (json.JSONDecodeError, OSError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def _save_state(path: Path, data: dict):
+    """Write *data* as JSON via a temporary file so readers never see a
+    half-written state file.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def _probe_mod(mod_folder: Path, mtime_ns: int) -> dict:
+    """Stat the folders discovery cares about for one mod."""
+    textures = mod_folder / PBR_TEX_REL.parent
+    try:
+        textures_mtime = textures.stat().st_mtime_ns
+    except OSError:
+        textures_mtime = None
+    has_meta = (mod_folder / "meta.ini").exists()
+    has_pbr = textures_mtime is not None and (mod_folder / PBR_TEX_REL).exists()
+    return {
+        "mtime": mtime_ns,
+        "textures_mtime": textures_mtime,
+        "pbr": has_meta and has_pbr,
+        "patcher": has_meta and (mod_folder / PATCHER_DIR).exists(),
+    }
+
+
+def _discovery_entry_valid(info, mod_folder: Path, mtime_ns: int) -> bool:
+    """Check a cached probe result against the mod folder's current state.
+
+    ``Textures/PBR`` can appear without touching the mod folder itself, so
+    the ``Textures`` folder mtime is compared too when it existed.
+    """
+    if not isinstance(info, dict) or info.get("mtime") != mtime_ns:
+        return False
+    textures_mtime = info.get("textures_mtime")
+    if textures_mtime is None:
+        return True
+    try:
+        current = (mod_folder / PBR_TEX_REL.parent).stat().st_mtime_ns
+    except OSError:
+        return False
+    return current == textures_mtime
+
+
+def _discover_mods(mods_path: Path, cache_path: Path = None,
+                   force_rescan: bool = False, metrics=_NULL_METRICS):
+    """Return ``(mods_with_pbr, mods_with_patcher)`` under *mods_path*.
+
+    A mod qualifies when it has a ``meta.ini`` plus ``Textures/PBR`` or a
+    ``PBRNifPatcher`` folder respectively.  With *cache_path*, probe results
+    are persisted and reused for every mod whose folder (and ``Textures``
+    folder) mtime is unchanged, so repeat runs only stat the mods directory
+    listing.  *force_rescan* ignores the cached results.
+    """
+    cache = {} if cache_path is None else _load_state(cache_path)
+    if force_rescan or cache.get("version") != DISCOVERY_CACHE_VERSION:
+        cache = {}
+    cached_mods = cache.get("mods", {})
+    mods = {}
+    mods_with_pbr = []
+    mods_with_patcher = []
+
+    with os.scandir(mods_path) as it:
+        for entry in it:
+            if not entry.is_dir():
+                continue
+            if any(kw in entry.name.lower() for kw in SKIP_KEYWORDS):
+                continue
+            mod_folder = mods_path / entry.name
+            mtime_ns = entry.stat().st_mtime_ns
+
+            info = cached_mods.get(entry.name)
+            if _discovery_entry_valid(info, mod_folder, mtime_ns):
+                metrics.count("mods_cached")
+            else:
+                info = _probe_mod(mod_folder, mtime_ns)
+                metrics.count("mods_probed")
+            mods[entry.name] = info
+
+            if info["pbr"]:
+                mods_with_pbr.append(mod_folder)
+            if info["patcher"]:
+                mods_with_patcher.append(mod_folder)
+
+    if cache_path is not None:
+        try:
+            _save_state(cache_path, {
+                "version": DISCOVERY_CACHE_VERSION,
+                "mods": mods,
+            })
+        except OSError:
+            pass
+    return mods_with_pbr, mods_with_patcher
+
+
+# ---------------------------------------------------------------------------
+# Generation engine
+# ---------------------------------------------------------------------------
+
+def _settings_hash(settings: dict) -> str:
+    """Stable digest of the generator settings, stored in manifests."""
+    payload = json.dumps(settings, sort_keys=True).encode("utf-8")
+    return hashlib.sha1(payload).hexdigest()
+
+
+def _file_stamp(path: Path):
+    """Return ``[mtime_ns, size]`` for *path*, or *None* if it is missing."""
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return [st.st_mtime_ns, st.st_size]
+
+
+class _EntryBuilder:
+    """PBRNifPatcher entry fields compiled once from the generator settings.
+
+    *settings* is what :meth:`PBRSettingsDialog.get_settings` returns (or
+    the CLI's settings file).  Every combination of detected companion
+    textures gets its fields precomputed in the order PBRNifPatcher JSONs
+    have always been written, so building an entry per texture is a single
+    dict update.  Fragments share the settings' values; treat them as
+    read-only.  With *analyze*, generate mode adjusts entries to their
+    textures (see :func:`_analyse_texture_set`); that is part of the
+    settings hash, so toggling it regenerates JSONs.
+    """
+
+    GENERAL_KEYS = (
+        "specular_level", "roughness_scale", "smooth_angle",
+        "subsurface_foliage", "vertex_colors", "vertex_color_lum_mult",
+        "vertex_color_sat_mult", "zbuffer_write", "auto_uv", "uv_scale",
+    )
+    EMISSIVE_KEYS = ("emissive_scale", "emissive_color")
+    PARALLAX_KEYS = ("displacement_scale",)
+    SUBSURFACE_KEYS = ("subsurface_color", "subsurface_opacity")
+    COAT_KEYS = (
+        "coat_diffuse", "coat_parallax", "coat_strength", "coat_roughness",
+        "coat_specular_level",
+    )
+    GLINT_KEYS = {
+        "glint_screen_space_scale": "screen_space_scale",
+        "glint_log_microfacet_density": "log_microfacet_density",
+        "glint_microfacet_roughness": "microfacet_roughness",
+        "glint_density_randomization": "density_randomization",
+    }
+
+    def __init__(self, settings: dict, analyze: bool = False):
+        self.settings = settings
+        self.analyze = analyze
+        self.settings_hash = _settings_hash(
+            {**settings, "analyze_textures": True} if analyze else settings
+        )
+
+        general = self._pick(self.GENERAL_KEYS)
+        emissive = self._pick(self.EMISSIVE_KEYS)
+        parallax = self._pick(self.PARALLAX_KEYS)
+        subsurface = self._pick(self.SUBSURFACE_KEYS)
+
+        # Fuzz or coat (mutually exclusive, fuzz wins).
+        fuzz_obj = {"texture": True}
+        if "fuzz_color" in settings:
+            fuzz_obj["color"] = settings["fuzz_color"]
+        if "fuzz_weight" in settings:
+            fuzz_obj["weight"] = settings["fuzz_weight"]
+        fuzz = {"fuzz": fuzz_obj}
+        coat = {"coat_normal": True, **self._pick(self.COAT_KEYS)}
+
+        tail = self._pick(("hair",))
+        glint = {
+            j_key: settings[s_key]
+            for s_key, j_key in self.GLINT_KEYS.items() if s_key in settings
+        }
+        if glint:
+            tail["glint"] = glint
+
+        self._fragments = {}
+        for flags in itertools.product((False, True), repeat=5):
+            has_glow, has_parallax, has_subsurface, has_fuzz, has_cnr = flags
+            fragment = {
+                "emissive": has_glow,
+                "parallax": has_parallax,
+                "subsurface": has_subsurface,
+            }
+            fragment.update(general)
+            if has_glow:
+                fragment.update(emissive)
+            if has_parallax:
+                fragment.update(parallax)
+            if has_subsurface:
+                fragment.update(subsurface)
+            if has_fuzz:
+                fragment.update(fuzz)
+            elif has_subsurface and has_cnr:
+                fragment.update(coat)
+            fragment.update(tail)
+            self._fragments[flags] = fragment
+
+    def _pick(self, keys) -> dict:
+        return {key: self.settings[key] for key in keys
+                if key in self.settings}
+
+    def fragment_for(self, tex_set, ignored=()) -> dict:
+        """Fields that follow ``texture``/``rename`` for the companions
+        found in *tex_set*, leaving out the *ignored* suffixes (see
+        :func:`_check_texture_set`).
+        """
+        def has(suffix):
+            return tex_set.has(suffix) and suffix not in ignored
+
+        return self._fragments[
+            has("g"), has("p"), has("s"), has("f"), has("cnr"),
+        ]
+
+
+def _generate_mod(base_path: Path, output_mod: Path, rename_enabled: bool,
+                  builder, instrument: bool = False,
+                  json_style: str = "indented", verbose_log: bool = True,
+                  granularity: str = "texture",
+                  progress=_NULL_PROGRESS, skip_keys=frozenset(),
+                  writer=_DISK) -> dict:
+    """Generate the JSON files for one selected mod.
+
+    This is the unit of work of generate mode: it only touches
+    ``<output_mod>/<mod name>`` and streams its own log file and keeps its
+    own counters, so several mods can run concurrently.  *builder* is the
+    run's :class:`_EntryBuilder`; *skip_keys* holds the texture keys (see
+    :func:`_texture_key`) left out because a higher-priority mod provides
+    them.  Outputs go through *writer* (:data:`_DISK`, or a dry run's
+    :class:`_Plan`).  A mod reached after *progress* was cancelled is left
+    untouched.
+
+    Returns a dict with ``out_root``, ``metrics`` and the ``created``,
+    ``updated``, ``unchanged``, ``removed`` and ``errors`` counters.
+    """
+    metrics = _new_metrics(instrument)
+    out_root = output_mod / base_path.name / PATCHER_DIR
+    if progress.cancelled:
+        counts = dict.fromkeys(
+            ("created", "updated", "unchanged", "removed", "errors"), 0
+        )
+        return {"out_root": out_root, "metrics": metrics, **counts}
+
+    writer.mkdir(out_root)
+    with writer.log(out_root / "generation_log.txt", verbose_log) as mod_log:
+        counts = _generate_outputs(base_path, out_root, rename_enabled,
+                                   builder, json_style, mod_log, metrics,
+                                   progress, granularity, skip_keys,
+                                   writer)
+        mod_log.extend(metrics.report_lines())
+    progress.end_mod()
+
+    result = {"out_root": out_root, "metrics": metrics}
+    result.update(counts)
+    return result
+
+
+def _entry_head(texture_str: str, rename_enabled: bool, mod_log) -> dict:
+    """Start an entry with its ``texture`` and, if enabled, ``rename``."""
+    entry = {"texture": texture_str}
+    if rename_enabled:
+        renamed = _rename_texture(texture_str)
+        if renamed:
+            entry["rename"] = renamed
+            mod_log.detail(f"Renamed: {texture_str} -> {renamed}")
+    return entry
+
+
+def _texture_key(texture) -> str:
+    return str(texture).replace("/", "\\").lower()
 
-            ITEM_IS_USER_CHECKABLE = Qt.ItemIsUserCheckable
-            ITEM_IS_ENABLED = Qt.ItemIsEnabled
-            USER_ROLE = Qt.UserRole
-            CHECKED = Qt.Checked
-            UNCHECKED = Qt.Unchecked
-        except ImportError:
-            # Fallback stubs so the module can at least be imported in
-            # environments that lack a Qt binding (e.g. linting, testing).
 
-            class _Signal:
-                """Dummy signal supporting .connect() calls."""
-                def connect(self, slot):
-                    pass
+def _output_groups(tex_sets: list, granularity: str, mod_name: str) -> list:
+    """Split *tex_sets* into ``(rel_dir, json_name, sets)`` per output JSON.
 
-            class QMessageBox:
-                @staticmethod
-                def information(parent, title, message):
-                    print(f"INFO [{title}]: {message}")
+    ``texture`` gives every set its own ``<base name>.json``; ``directory``
+    writes one ``<directory>.json`` per texture directory and ``mod`` a
+    single ``<mod name>.json``.  Entries keep the scan order.
+    """
+    if granularity == "mod":
+        return [(Path(), f"{mod_name}.json", tex_sets)] if tex_sets else []
+    if granularity == "directory":
+        return [
+            (rel_dir, f"{rel_dir.name or mod_name}.json", list(group))
+            for rel_dir, group in itertools.groupby(
+                tex_sets, key=lambda tex_set: tex_set.rel_dir
+            )
+        ]
+    return [
+        (tex_set.rel_dir, f"{tex_set.base_name}.json", [tex_set])
+        for tex_set in tex_sets
+    ]
 
-                @staticmethod
-                def warning(parent, title, message):
-                    print(f"WARNING [{title}]: {message}")
 
-                @staticmethod
-                def critical(parent, title, message):
-                    print(f"CRITICAL [{title}]: {message}")
+def _texture_paths(base_path: Path) -> list:
+    """Return the texture path of every set in a mod's ``Textures/PBR``.
 
-                class StandardButton:
-                    Ok = 1024
-                    Cancel = 4194304
-                    Yes = 16384
-                    No = 65536
+    Only the paths are kept, so the scans of all selected mods can be held
+    at once while :func:`_texture_conflicts` compares them.
+    """
+    return [
+        tex_set.texture_path
+        for tex_set in _scan_texture_sets(base_path / PBR_TEX_REL)
+    ]
+
+
+def _texture_conflicts(scans, priority=()) -> dict:
+    """Find the textures that more than one scanned mod provides.
+
+    *scans* pairs every selected mod folder with its texture paths (see
+    :func:`_texture_paths`) and *priority* lists mod names in MO2 priority
+    order, lowest first; mods it does not list rank below all listed ones,
+    in selection order.  Returns ``{texture key: [(mod folder, texture
+    path), ...]}`` for every texture provided more than once, lowest
+    priority first, so the last pair is the one PBRNifPatcher ends up
+    using.
+    """
+    rank = {name: i for i, name in enumerate(priority)}
+    order = sorted(
+        range(len(scans)),
+        key=lambda i: (rank.get(scans[i][0].name, -1), i),
+    )
+    providers = {}
+    for i in order:
+        mod_folder, texture_paths = scans[i]
+        for texture_path in texture_paths:
+            providers.setdefault(
+                _texture_key(texture_path), []
+            ).append((mod_folder, texture_path))
+    return {
+        key: mods for key, mods in providers.items() if len(mods) > 1
+    }
+
+
+def _conflict_report_lines(conflicts: dict, winners_only: bool,
+                           ordered: bool = True) -> list:
+    """Lines of ``conflict_report.txt`` for :func:`_texture_conflicts`.
+
+    Without *ordered* no load order was available, so the providers are
+    listed in selection order and no winner is named.
+    """
+    if not ordered:
+        lines = [
+            f"{len(conflicts)} textures are provided by more than one "
+            "selected mod.",
+            "No load order was available, so no winner is named; every mod "
+            "got its own entry and PBRNifPatcher applies the one from the "
+            "mod loaded last in MO2.",
+            "",
+        ]
+        lines.extend(
+            f"{conflicts[key][0][1]}: provided by "
+            + ", ".join(mod_folder.name for mod_folder, _ in conflicts[key])
+            for key in sorted(conflicts)
+        )
+        return lines
+
+    overridden = {}
+    rows = []
+    for key in sorted(conflicts):
+        providers = conflicts[key]
+        winner, texture_path = providers[-1]
+        losers = [mod_folder.name for mod_folder, _ in providers[-2::-1]]
+        for name in losers:
+            overridden[name] = overridden.get(name, 0) + 1
+        rows.append(
+            f"{texture_path}: {winner.name} wins over "
+            f"{', '.join(losers)}"
+        )
 
-            class QDialog:
-                class DialogCode:
-                    Accepted = 1
-                    Rejected = 0
+    lines = [
+        f"{len(conflicts)} textures are provided by more than one selected "
+        "mod; the mod loaded last in MO2 wins.",
+        "Only the winning entries were generated." if winners_only else
+        "Every mod got its own entry; PBRNifPatcher applies the winner's.",
+        "",
+        "Overridden textures per mod:",
+    ]
+    lines.extend(
+        f"    {name}: {count}" for name, count in sorted(overridden.items())
+    )
+    lines.append("")
+    lines.extend(rows)
+    return lines
+
+
+def _edited_orphans(old_outputs: dict, new_keys: set, out_root: Path,
+                    mod_log, metrics=_NULL_METRICS):
+    """Load the hand-edited outputs that this run's layout does not rewrite.
+
+    An output from *old_outputs* counts when no new output has its key
+    (see *new_keys*) and it was merged from a hand-edited JSON or edited
+    since it was written; this happens when *output_granularity* changes.
+    Returns ``(carried, orphans, errors)``: *carried* maps
+    :func:`_texture_key` to ``(out_key, entry)`` for every entry they hold
+    (the first one found wins), *orphans* maps each such output's key to
+    the texture keys of its entries, or *None* when some entry cannot be
+    matched to a texture, and *errors* counts unreadable files.
+    """
+    carried = {}
+    orphans = {}
+    errors = 0
+    for out_key, old in old_outputs.items():
+        if out_key in new_keys:
+            continue
+        path = out_root / old.get("path", out_key)
+        stamp = _file_stamp(path)
+        metrics.count("stats")
+        if stamp is None or (
+            old.get("origin") == "generated" and old.get("output") == stamp
+        ):
+            continue
+        try:
+            data = _read_json(path, metrics)
+        except (json.JSONDecodeError, OSError) as exc:
+            mod_log.write(f"ERROR reading {path.name}: {exc}")
+            errors += 1
+            orphans[out_key] = None
+            continue
+
+        texture_keys = set()
+        for entry in data if isinstance(data, list) else (data,):
+            texture = entry.get("texture") if isinstance(entry, dict) else None
+            if not isinstance(texture, str):
+                texture_keys = None
+                break
+            key = _texture_key(texture)
+            texture_keys.add(key)
+            carried.setdefault(key, (out_key, entry))
+        orphans[out_key] = texture_keys
+    return carried, orphans, errors
+
+
+def _generate_outputs(base_path: Path, out_root: Path, rename_enabled: bool,
+                      builder, json_style: str, mod_log, metrics,
+                      progress=_NULL_PROGRESS,
+                      granularity: str = "texture", skip_keys=frozenset(),
+                      writer=_DISK) -> dict:
+    """Bring one mod's outputs below *out_root* up to date.
+
+    *granularity* picks what one JSON covers (see :func:`_output_groups`).
+    A manifest next to the mod's ``PBRNifPatcher`` folder records, for every
+    JSON written, its source ``_rmaos.dds`` files, the companion files'
+    mtimes and sizes, the settings hash, the rename flag, the JSON style
+    and the JSON's own stamp.  On the next run an output whose inputs all
+    match is left alone; otherwise a JSON this tool generated and nobody
+    edited since is regenerated from the current settings, while any other
+    existing JSON keeps its fields and only gets its texture paths
+    refreshed: per texture, matching entries by ``texture``, when a JSON
+    holds several.  Entries of hand-edited JSONs that the current
+    *granularity* no longer writes are carried into the new outputs by
+    texture (see :func:`_edited_orphans`); such a JSON is only deleted once
+    all of its entries were carried over.  The textures of every output
+    that is rebuilt are checked first (see :func:`_check_texture_set`);
+    problems are logged as warnings.  When *builder* analyses textures, their entries are adjusted
+    as :func:`_analyse_texture_set` suggests.  Outputs whose sources
+    disappeared are deleted.
+
+    When *progress* is cancelled the loop stops before the next texture;
+    the manifest keeps the old records of everything not reached and no
+    outputs are removed.  Log lines go to the *mod_log* sink; returns the
+    counters.
+    """
+    mod_pbr = base_path / PBR_TEX_REL
+    manifest_path = out_root.parent / MANIFEST_NAME
+    with metrics.phase("manifest"):
+        manifest = _load_state(manifest_path)
+    if manifest.get("version") != MANIFEST_VERSION:
+        manifest = {}
+    old_outputs = manifest.get("outputs", {})
+    outputs = {}
+    settings_hash = builder.settings_hash
+
+    counts = dict.fromkeys(
+        ("created", "updated", "unchanged", "removed", "errors"), 0
+    )
+    out_listings = {}
+    seen = set()
+
+    with metrics.phase("scan"):
+        tex_sets = _scan_texture_sets(mod_pbr)
+    overridden = 0
+    if skip_keys:
+        scanned = len(tex_sets)
+        tex_sets = [
+            tex_set for tex_set in tex_sets
+            if _texture_key(tex_set.texture_path) not in skip_keys
+        ]
+        overridden = scanned - len(tex_sets)
+    metrics.count("texture_sets", len(tex_sets))
+    progress.begin_mod(base_path.name, len(tex_sets))
+    processed = 0
+    keyed = granularity != "texture"
+    groups = _output_groups(tex_sets, granularity, base_path.name)
+    carried, orphans, counts["errors"] = _edited_orphans(
+        old_outputs,
+        {(rel_dir / json_name).as_posix().lower()
+         for rel_dir, json_name, _ in groups},
+        out_root, mod_log, metrics,
+    )
+    merged_in = set()
+
+    for rel_dir, json_name, group in groups:
+        if progress.cancelled:
+            break
+        progress.advance(len(group))
+        processed += len(group)
+
+        # List (and create) each output directory once, rather than
+        # probing every JSON path individually.
+        parent_out = out_root / rel_dir
+        existing_names = out_listings.get(rel_dir)
+        if existing_names is None:
+            writer.mkdir(parent_out)
+            existing_names = _list_file_names(parent_out)
+            out_listings[rel_dir] = existing_names
+            metrics.count("dirs_listed")
+        existing_name = existing_names.get(json_name.lower())
+        json_path = parent_out / (existing_name or json_name)
+
+        out_rel = (rel_dir / json_path.name).as_posix()
+        out_key = out_rel.lower()
+        seen.add(out_key)
+        record = {"path": out_rel}
+        if keyed:
+            record["sources"] = [
+                [(tex_set.rel_dir / tex_set.files[RMAOS_SUFFIX].name)
+                 .as_posix(), tex_set.stamps()]
+                for tex_set in group
+            ]
+        else:
+            record["source"] = (
+                rel_dir / group[0].files[RMAOS_SUFFIX].name
+            ).as_posix()
+            record["stamps"] = group[0].stamps()
+        record["settings"] = settings_hash
+        record["rename"] = rename_enabled
+        record["style"] = json_style
+        metrics.count("stats", sum(len(tex_set.files) for tex_set in group))
+        old = old_outputs.get(out_key)
+        output_stamp = None
+        if existing_name is not None:
+            output_stamp = _file_stamp(json_path)
+            metrics.count("stats")
+        output_owned = (
+            old is not None and output_stamp is not None
+            and old.get("output") == output_stamp
+        )
+        inherited = [
+            carried.get(_texture_key(tex_set.texture_path))
+            for tex_set in group
+        ] if carried else [None] * len(group)
+
+        if output_owned and not any(inherited) and all(
+            old.get(k) == v for k, v in record.items() if k != "path"
+        ):
+            record["origin"] = old.get("origin")
+            record["output"] = output_stamp
+            outputs[out_key] = record
+            counts["unchanged"] += 1
+            writer.keep(json_path)
+            continue
+
+        # Only outputs being rebuilt have their textures checked (and
+        # analysed); every file read is part of the record compared above.
+        ignored = []
+        adjusted = []
+        for tex_set in group:
+            skip, problems, headers = _check_texture_set(tex_set, metrics)
+            for problem in problems:
+                mod_log.write(f"WARNING {problem}")
+            overrides = {}
+            if builder.analyze:
+                overrides, dark_glow, report = _analyse_texture_set(
+                    tex_set, headers, builder.settings, metrics
+                )
+                if dark_glow:
+                    skip.add("g")
+                if report:
+                    mod_log.detail(report)
+            ignored.append(skip)
+            adjusted.append(overrides)
+
+        # A JSON we did not generate (or that was edited since) keeps its
+        # fields; only texture paths are updated.  A single-texture JSON
+        # takes them from its first entry, a merged one per texture.
+        # Entries carried from edited JSONs of another layout fill in
+        # textures the JSON itself does not cover.
+        regenerate = output_owned and old.get("origin") == "generated"
+        kept = None
+        if existing_name is not None and not regenerate:
+            try:
+                existing_data = _read_json(json_path, metrics)
+            except (json.JSONDecodeError, OSError) as exc:
+                mod_log.write(f"ERROR reading {json_path.name}: {exc}")
+                counts["errors"] += 1
+                if old is not None:
+                    outputs[out_key] = old
+                continue
 
-                def __init__(self, parent=None):
-                    pass
+            if isinstance(existing_data, list) and existing_data:
+                if keyed:
+                    kept = {}
+                    for old_entry in existing_data:
+                        if isinstance(old_entry, dict):
+                            kept.setdefault(
+                                _texture_key(old_entry.get("texture", "")),
+                                old_entry,
+                            )
+                else:
+                    kept = {
+                        _texture_key(group[0].texture_path): existing_data[0]
+                    }
+        if any(inherited):
+            kept = dict(kept or {})
+            for tex_set, found in zip(group, inherited):
+                if found is not None:
+                    kept.setdefault(
+                        _texture_key(tex_set.texture_path), found[1]
+                    )
 
-                def exec(self):
-                    return 0
+        if kept is not None:
+            entries = []
+            merged_here = []
+            for tex_set, skip, overrides, found in zip(
+                group, ignored, adjusted, inherited
+            ):
+                texture_str = tex_set.texture_path
+                new_entry = _entry_head(texture_str, rename_enabled, mod_log)
+                old_entry = kept.get(_texture_key(texture_str))
+                if old_entry is None:
+                    new_entry.update(builder.fragment_for(tex_set, skip))
+                    new_entry.update(overrides)
+                else:
+                    for k, v in old_entry.items():
+                        if k not in ("texture", "rename"):
+                            new_entry[k] = v
+                if found is not None:
+                    merged_here.append(
+                        (found[0], _texture_key(texture_str))
+                    )
+                entries.append(new_entry)
+
+            if writer.write_json(json_path, entries, metrics, json_style):
+                if existing_name is None:
+                    mod_log.detail(f"Created: {json_path.name}")
+                    counts["created"] += 1
+                else:
+                    mod_log.detail(f"Updated: {json_path.name}")
+                    counts["updated"] += 1
+            else:
+                counts["unchanged"] += 1
+            merged_in.update(merged_here)
+            record["origin"] = "merged"
+            record["output"] = _file_stamp(json_path)
+            metrics.count("stats")
+            outputs[out_key] = record
+            continue
+
+        # Companion textures come from the single directory listing.
+        entries = []
+        for tex_set, skip, overrides in zip(group, ignored, adjusted):
+            entry = _entry_head(tex_set.texture_path, rename_enabled, mod_log)
+            entry.update(builder.fragment_for(tex_set, skip))
+            entry.update(overrides)
+            entries.append(entry)
+
+        if not writer.write_json(json_path, entries, metrics, json_style):
+            counts["unchanged"] += 1
+        elif existing_name is None:
+            mod_log.detail(f"Created: {json_path.name}")
+            counts["created"] += 1
+        else:
+            mod_log.detail(f"Updated: {json_path.name}")
+            counts["updated"] += 1
+        record["origin"] = "generated"
+        record["output"] = _file_stamp(json_path)
+        metrics.count("stats")
+        outputs[out_key] = record
+
+    if overridden:
+        mod_log.write(
+            f"{overridden} textures left to higher-priority mods "
+            "(see conflict_report.txt)"
+        )
+    elif not tex_sets:
+        mod_log.write(
+            f"Skipped {base_path.name}: "
+            "no *_rmaos.dds in Textures/PBR"
+        )
 
-                def setWindowTitle(self, title):
-                    pass
+    cancelled = processed < len(tex_sets)
+    if cancelled:
+        mod_log.write(
+            f"Cancelled: {processed} of {len(tex_sets)} textures processed"
+        )
 
-                def setMinimumWidth(self, w):
-                    pass
+    # Outputs whose source _rmaos.dds disappeared since the last run.
+    for out_key, old in old_outputs.items():
+        if out_key in seen:
+            continue
+        if cancelled:
+            # Not reached this run, so not known to be stale.
+            outputs[out_key] = old
+            continue
+        stale = out_root / old.get("path", out_key)
+        if out_key in orphans:
+            texture_keys = orphans[out_key]
+            if texture_keys is None or any(
+                (out_key, key) not in merged_in for key in texture_keys
+            ):
+                mod_log.write(
+                    f"Kept {stale.name}: edited by hand and not all of "
+                    "its entries could be merged into the new outputs"
+                )
+                outputs[out_key] = old
+                continue
+        try:
+            writer.remove(stale)
+        except FileNotFoundError:
+            continue
+        except OSError as exc:
+            mod_log.write(f"ERROR removing {stale.name}: {exc}")
+            counts["errors"] += 1
+            outputs[out_key] = old
+            continue
+        mod_log.detail(f"Removed: {stale.name}")
+        counts["removed"] += 1
+
+    if counts["unchanged"]:
+        mod_log.write(f"{counts['unchanged']} files unchanged")
+
+    with metrics.phase("manifest"):
+        writer.save_state(manifest_path, {
+            "version": MANIFEST_VERSION,
+            "outputs": outputs,
+        })
+    return counts
+
+
+def _resolve_worker_count(value) -> int:
+    """Turn the *generate_workers* setting into a thread count.
+
+    ``0`` (or anything invalid) means one worker per CPU.
+    """
+    try:
+        count = int(value)
+    except (TypeError, ValueError):
+        count = 0
+    if count <= 0:
+        count = os.cpu_count() or 1
+    return count
 
-                def setMinimumHeight(self, h):
-                    pass
 
-                def accept(self):
-                    pass
+def _map_units(func, units, workers: int) -> list:
+    """Run ``func(*unit)`` for every unit and return results in unit order.
 
-                def reject(self):
-                    pass
+    With more than one worker the units run on a thread pool; results are
+    still collected in submission order so merged output is deterministic.
+    """
+    if workers <= 1 or len(units) <= 1:
+        return [func(*unit) for unit in units]
+    from concurrent.futures import ThreadPoolExecutor
 
-            class QVBoxLayout:
-                def __init__(self, parent=None):
-                    pass
+    with ThreadPoolExecutor(max_workers=min(workers, len(units))) as pool:
+        return list(pool.map(lambda unit: func(*unit), units))
 
-                def addWidget(self, widget):
-                    pass
 
-            class QLabel:
-                def __init__(self, text=""):
-                    self._text = text
+# ---------------------------------------------------------------------------
+# Update engine
+# ---------------------------------------------------------------------------
 
-                def setText(self, text):
-                    self._text = text
+def _update_json_file(json_file: Path, patcher: Path, out_root: Path,
+                      texture_index: dict, by_name: dict,
+                      rename_enabled: bool, metrics=_NULL_METRICS,
+                      json_style: str = "indented",
+                      verbose_log: bool = True, writer=_DISK) -> dict:
+    """Rewrite the texture paths of one PBRNifPatcher JSON file.
+
+    *texture_index* maps a normalised stem to its texture path and *by_name*
+    is the basename multimap from :func:`_build_rmaos_index`.  The result is
+    written below *out_root* through *writer* unless it is byte-identical
+    already; returns a dict with ``log`` (list of lines, per-entry and
+    per-file lines only when *verbose_log*), ``updated``, ``copied``,
+    ``errors``, ``wrote`` (an output was produced) and ``unchanged`` (it
+    already matched on disk).
+    """
+    result = {"log": [], "updated": 0, "copied": 0, "errors": 0,
+              "wrote": False, "unchanged": False}
+    log = result["log"]
+    try:
+        existing_data = _read_json(json_file, metrics)
+    except (json.JSONDecodeError, OSError) as exc:
+        log.append(f"ERROR reading {json_file.name}: {exc}")
+        result["errors"] += 1
+        return result
 
-            class QListWidget:
-                def __init__(self, parent=None):
-                    self._items = []
+    entries, is_wrapped = _extract_entries(existing_data)
+    if entries is None:
+        return result
 
-                def addItem(self, item):
-                    self._items.append(item)
+    new_entries = []
+    entries_updated = 0
+    entries_copied = 0
+
+    for entry in entries:
+        if not (isinstance(entry, dict) and "texture" in entry):
+            new_entries.append(entry)
+            entries_copied += 1
+            continue
+
+        texture_key = entry["texture"].replace("\\", "/").lower()
+        new_tex = texture_index.get(texture_key)
+
+        # Fallback: match by filename only
+        if new_tex is None:
+            fname = texture_key.rsplit("/", 1)[-1]
+            candidates = by_name.get(fname)
+            if candidates:
+                new_tex = texture_index[candidates[0]]
+                if len(candidates) > 1:
+                    log.append(
+                        f"Ambiguous match: {entry['texture']} -> {new_tex} "
+                        f"({len(candidates)} candidates)"
+                    )
 
-                def count(self):
-                    return len(self._items)
+        if new_tex is not None:
+            new_entry = {"texture": new_tex}
+            if rename_enabled:
+                renamed = _rename_texture(new_tex)
+                if renamed:
+                    new_entry["rename"] = renamed
+                    if verbose_log:
+                        log.append(f"Renamed: {new_tex} -> {renamed}")
+
+            for k, v in entry.items():
+                if k not in ("texture", "rename"):
+                    new_entry[k] = v
+
+            new_entries.append(new_entry)
+            entries_updated += 1
+        else:
+            new_entries.append(entry)
+            entries_copied += 1
+            if verbose_log:
+                log.append(
+                    f"Copied unchanged: {entry['texture']} "
+                    "(no _rmaos.dds found)"
+                )
 
-                def item(self, index):
-                    return self._items[index]
+    if entries_updated > 0 or entries_copied > 0:
+        if is_wrapped:
+            output_data = {**existing_data, "entries": new_entries}
+        else:
+            output_data = new_entries
+
+        out_dir = out_root / json_file.relative_to(patcher).parent
+        writer.mkdir(out_dir)
+        out_path = out_dir / json_file.name
+
+        result["updated"] = entries_updated
+        result["copied"] = entries_copied
+        result["wrote"] = True
+        if writer.write_json(out_path, output_data, metrics, json_style):
+            if verbose_log:
+                log.append(f"Wrote: {out_path.name}")
+        else:
+            result["unchanged"] = True
+            if verbose_log:
+                log.append(f"Unchanged: {out_path.name}")
+    return result
 
-                def clear(self):
-                    self._items.clear()
 
-                def setEnabled(self, enabled):
-                    pass
+# The global index a worker process received once at start-up; see
+# _open_process_pool().
+_SHARED_INDEX = None
 
-            class QListWidgetItem:
-                def __init__(self, text=""):
-                    self._text = text
-                    self._checked = False
-                    self._data = None
-                    self._flags = 0
 
-                def text(self):
-                    return self._text
+def _set_shared_index(shared_index):
+    global _SHARED_INDEX
+    _SHARED_INDEX = shared_index
 
-                def setData(self, role, value):
-                    self._data = value
 
-                def data(self, role):
-                    return self._data
+def _update_json_batch(json_files, patcher, out_root, texture_index, by_name,
+                       rename_enabled, instrument=False,
+                       json_style="indented", verbose_log=True):
+    """Process a batch of JSON files; the job shipped to worker processes.
 
-                def flags(self):
-                    return self._flags
+    A *texture_index* of *None* means the worker's shared global index.
+    Returns ``(results, metrics)`` with one result dict per file.
+    """
+    if texture_index is None:
+        texture_index, by_name = _SHARED_INDEX
+    metrics = _new_metrics(instrument)
+    results = [
+        _update_json_file(json_file, patcher, out_root, texture_index,
+                          by_name, rename_enabled, metrics, json_style,
+                          verbose_log)
+        for json_file in json_files
+    ]
+    return results, metrics
+
+
+def _batched(items: list, size: int) -> list:
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def _open_process_pool(processes: int, python_executable: str = "",
+                       shared_index=None):
+    """Start a spawn-based process pool for update mode, or return *None*.
+
+    Inside MO2 ``sys.executable`` is ModOrganizer.exe, so workers need an
+    explicit Python interpreter (*python_executable*) of the same version.
+    That sets the spawn executable for the whole interpreter; callers
+    restore it after shutting the pool down.  A *shared_index* from
+    :func:`_build_global_index` is sent to every worker once rather than
+    with each batch.  Any failure to start the pool falls back to
+    in-process work.
+    """
+    executable = python_executable or sys.executable
+    if not Path(executable).name.lower().startswith("python"):
+        return None
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    ctx = multiprocessing.get_context("spawn")
+    ctx.set_executable(executable)
+    try:
+        return ProcessPoolExecutor(
+            max_workers=processes, mp_context=ctx,
+            initializer=_set_shared_index, initargs=(shared_index,),
+        )
+    except (OSError, ValueError):
+        return None
+
+
+class _ModUpdate:
+    """Update-mode work for one selected mod, possibly spread over a pool."""
+
+    def __init__(self, mod_folder: Path, output_mod: Path,
+                 rename_enabled: bool, batch_size: int = UPDATE_BATCH_SIZE,
+                 instrument: bool = False, json_style: str = "indented",
+                 verbose_log: bool = True, shared_index=None,
+                 writer=_DISK):
+        self.mod_folder = mod_folder
+        self.patcher = mod_folder / PATCHER_DIR
+        self.out_root = output_mod / mod_folder.name / PATCHER_DIR
+        self.rename_enabled = rename_enabled
+        self.json_style = json_style
+        self.verbose_log = verbose_log
+        self.metrics = _new_metrics(instrument)
+        self.writer = writer
+        self.shared = shared_index is not None
+
+        if self.shared:
+            self.texture_index, self.by_name = shared_index
+        else:
+            with self.metrics.phase("index"):
+                rmaos_index, self.by_name = _build_rmaos_index(
+                    mod_folder / PBR_TEX_REL
+                )
+            self.metrics.count("rmaos_indexed", len(rmaos_index))
+            self.texture_index = {
+                key: tex_set.texture_path
+                for key, tex_set in rmaos_index.items()
+            }
+        with self.metrics.phase("list"):
+            json_files = list(self.patcher.rglob("*.json"))
+        self.file_count = len(json_files)
+        self.batches = _batched(json_files, batch_size)
+        self._futures = None
+
+    def _args(self, batch):
+        # Workers already hold a shared index; do not pickle it per batch.
+        if self.shared:
+            texture_index = by_name = None
+        else:
+            texture_index, by_name = self.texture_index, self.by_name
+        return (batch, self.patcher, self.out_root, texture_index, by_name,
+                self.rename_enabled, self.metrics.enabled, self.json_style,
+                self.verbose_log)
 
-                def setFlags(self, flags):
-                    self._flags = flags
+    def submit(self, pool):
+        """Queue every batch on *pool* without waiting for results."""
+        from concurrent.futures.process import BrokenProcessPool
 
-                def setCheckState(self, state):
-                    self._checked = (state == 2)
+        try:
+            self._futures = [
+                pool.submit(_update_json_batch, *self._args(batch))
+                for batch in self.batches
+            ]
+        except BrokenProcessPool:
+            self._futures = None
+
+    def cancel(self):
+        """Drop queued batches; batches already running still finish."""
+        for future in self._futures or ():
+            if future is not None:
+                future.cancel()
+
+    def _update_in_process(self, batch, progress):
+        for json_file in batch:
+            if progress.cancelled:
+                return
+            progress.advance()
+            yield _update_json_file(
+                json_file, self.patcher, self.out_root, self.texture_index,
+                self.by_name, self.rename_enabled, self.metrics,
+                self.json_style, self.verbose_log, self.writer,
+            )
 
-                def checkState(self):
-                    return 2 if self._checked else 0
+    def results(self, progress=_NULL_PROGRESS):
+        """Yield per-file results in discovery order, one batch at a time.
 
-            class QDialogButtonBox:
-                class StandardButton:
-                    Ok = 1024
-                    Cancel = 4194304
+        Batches that were not submitted, or whose worker pool broke, are
+        processed in this process instead; rewriting is idempotent.  Once
+        *progress* is cancelled no further file is started here, queued
+        batches are dropped and batches already running are collected.
+        """
+        progress.begin_mod(self.mod_folder.name, self.file_count)
+        for i, batch in enumerate(self.batches):
+            outcome = None
+            if progress.cancelled:
+                # Batches a worker already started are still written, so
+                # collect them to keep the log and counters truthful.
+                self.cancel()
+                if self._futures is None or self._futures[i].cancelled():
+                    continue
+            if self._futures is not None:
+                from concurrent.futures.process import BrokenProcessPool
 
-                def __init__(self, buttons=0):
-                    pass
+                try:
+                    outcome = self._futures[i].result()
+                except BrokenProcessPool:
+                    outcome = None
+            if outcome is None:
+                yield from self._update_in_process(batch, progress)
+                continue
+            batch_results, batch_metrics = outcome
+            self.metrics.merge(batch_metrics)
+            self._futures[i] = None
+            progress.advance(len(batch_results))
+            yield from batch_results
+        progress.end_mod()
 
-                @property
-                def accepted(self):
-                    return _Signal()
 
-                @property
-                def rejected(self):
-                    return _Signal()
+# ---------------------------------------------------------------------------
+# Runs (shared by the MO2 tool and the command line)
+# ---------------------------------------------------------------------------
 
-            class QCheckBox:
-                def __init__(self, text=""):
-                    self._checked = False
+def _ensure_output_mod(mod: Path, writer=_DISK) -> Path:
+    """Create the output mod folder *mod* with a ``meta.ini`` if needed."""
+    writer.mkdir(mod)
+    meta = mod / "meta.ini"
+    if not meta.exists():
+        writer.write_text(meta, META_INI_CONTENT)
+    return mod
 
-                def isChecked(self):
-                    return self._checked
 
-                @property
-                def clicked(self):
-                    return _Signal()
+def _write_log(path: Path, lines):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text("\n".join(lines), encoding="utf-8")
 
-                def setEnabled(self, enabled):
-                    pass
 
-            class QLineEdit:
-                def __init__(self, parent=None):
-                    pass
+def _link_tree(source: Path, target: Path, metrics=_NULL_METRICS):
+    """Recreate *source* at *target* with hard links to its files.
 
-                def text(self):
-                    return ""
+    Linking costs one directory entry per file, however large the files
+    are.  Where the file system cannot link, files are copied with their
+    mtimes, so manifest stamps still match.
+    """
+    for dirpath, _, filenames in os.walk(source):
+        out_dir = os.path.join(target, os.path.relpath(dirpath, source))
+        os.makedirs(out_dir, exist_ok=True)
+        for name in filenames:
+            _link_file(
+                os.path.join(dirpath, name), os.path.join(out_dir, name)
+            )
+        metrics.count("files_linked", len(filenames))
 
-                @property
-                def textChanged(self):
-                    return _Signal()
 
-            class QTabWidget:
-                def __init__(self, parent=None): pass
-                def addTab(self, widget, label): pass
+def _link_file(src: str, dst: str):
+    """Hard-link *src* to *dst*, or copy it with its mtime if linking fails."""
+    try:
+        os.link(src, dst)
+    except OSError:
+        import shutil
 
-            class QDoubleSpinBox:
-                def __init__(self, parent=None):
-                    self._value = 0.0
-                def setRange(self, min_val, max_val): pass
-                def setDecimals(self, decimals): pass
-                def setSingleStep(self, step): pass
-                def setValue(self, value): self._value = value
-                def value(self): return self._value
-                def setEnabled(self, enabled): pass
+        shutil.copy2(src, dst)
 
-            class QHBoxLayout:
-                def __init__(self, parent=None): pass
-                def addWidget(self, widget): pass
 
-            class QFormLayout:
-                def __init__(self, parent=None): pass
-                def addRow(self, *args): pass
+def _mirror_output(live: Path, staging: Path, touched,
+                   metrics=_NULL_METRICS) -> list:
+    """Start *staging* as a mirror of the parts of *live* a run can change.
 
-            class QWidget:
-                def __init__(self, parent=None): pass
-                def setLayout(self, layout): pass
+    The output mod's own files and the folders named in *touched* (the
+    selected mods) are linked with :func:`_link_tree`; every other folder
+    belongs to a mod the run leaves alone and is not copied.  Returns the
+    names of those folders, which :func:`_swap_output` moves across.
+    """
+    staging.mkdir(parents=True)
+    carried = []
+    with os.scandir(live) as it:
+        for entry in it:
+            if not entry.is_dir():
+                _link_file(entry.path, os.path.join(staging, entry.name))
+                metrics.count("files_linked")
+            elif entry.name in touched:
+                _link_tree(Path(entry.path), staging / entry.name, metrics)
+            else:
+                carried.append(entry.name)
+    return carried
+
+
+def _work_dir(mods_path: Path) -> Path:
+    """Folder holding the staging and previous copies of the output mods.
+
+    That is :data:`WORK_DIR_NAME` beside *mods_path*, which MO2 does not
+    list.  The copies are moved in and out by renaming, which only works
+    within one volume; when that folder is on another volume or cannot be
+    created, *mods_path* itself is used.
+    """
+    work = mods_path.parent / WORK_DIR_NAME
+    try:
+        work.mkdir(exist_ok=True)
+        if work.stat().st_dev == mods_path.stat().st_dev:
+            return work
+        work.rmdir()
+    except OSError:
+        pass
+    return mods_path
+
+
+def _swap_output(staging: Path, live: Path, previous: Path, carried=()):
+    """Move *staging* to *live*, keeping what it replaces as *previous*.
+
+    The folders named in *carried* are first moved from *live* into
+    *staging*, so *previous* only holds the parts of the output the run
+    replaced.  Every step is a directory rename, so no mod folder is ever
+    seen half-written.  If a rename fails, everything moved so far is put
+    back and the error raised, leaving the finished output in *staging*.
+    The previous copy loses its ``meta.ini``, so MO2 does not take it for
+    a mod when it sits in the mods folder.
+    """
+    import shutil
+
+    if previous.exists():
+        shutil.rmtree(previous)
+    if not live.exists():
+        staging.rename(live)
+        return
+    moved = []
+    try:
+        for name in carried:
+            (live / name).rename(staging / name)
+            moved.append(name)
+        live.rename(previous)
+        try:
+            staging.rename(live)
+        except OSError:
+            previous.rename(live)
+            raise
+    except OSError:
+        for name in moved:
+            (staging / name).rename(live / name)
+        raise
+    try:
+        (previous / "meta.ini").unlink()
+    except FileNotFoundError:
+        pass
+
+
+@contextlib.contextmanager
+def _staged_output(mods_path: Path, name: str, selected=(), writer=_DISK,
+                   metrics=_NULL_METRICS):
+    """Yield the folder a run writes the output mod *name* into.
+
+    *selected* are the mod folders the run processes.  A real run writes
+    into ``<name>.staging`` in the work folder (see :func:`_work_dir`).
+    That folder starts as a hardlinked mirror of the selected mods' output
+    folders (see :func:`_mirror_output`), so unchanged outputs cost nothing
+    and incremental runs still see their manifests; other mods' output is
+    not touched.  When the body finishes, cancelled or not, the staging
+    folder replaces the output mod and the other mods' folders are moved
+    across (see :func:`_swap_output`).  MO2 and PBRNifPatcher never see a
+    half-written mod folder.  If the body raises, the output mod is left as
+    it was and the staging folder is kept, without its ``meta.ini``, so the
+    mod logs written so far survive until the next run; the error then
+    says where they are.  A dry run (*writer* is a :class:`_Plan`) compares
+    against the output mod itself.
+    """
+    live = mods_path / name
+    if writer.dry_run:
+        yield live
+        return
+    import shutil
+
+    work = _work_dir(mods_path)
+    staging = work / (name + STAGING_SUFFIX)
+    carried = []
+    with metrics.phase("stage"):
+        if staging.exists():
+            # Left behind by an interrupted run.
+            shutil.rmtree(staging)
+        if live.is_dir():
+            carried = _mirror_output(
+                live, staging, {mod_folder.name for mod_folder in selected},
+                metrics,
+            )
+    try:
+        yield staging
+    except BaseException as exc:
+        try:
+            (staging / "meta.ini").unlink()
+        except OSError:
+            pass
+        if isinstance(exc, Exception):
+            raise RuntimeError(
+                f"{exc}\nThe logs of the failed run are kept in {staging} "
+                "until the next run."
+            ) from exc
+        raise
+    with metrics.phase("swap"):
+        _swap_output(
+            staging, live, work / (name + PREVIOUS_SUFFIX), carried
+        )
 
-            class QIcon:
-                pass
 
-            ITEM_IS_USER_CHECKABLE = 1
-            ITEM_IS_ENABLED = 2
-            USER_ROLE = 32
-            CHECKED = 2
-            UNCHECKED = 0
+def _run_generate(mods_path: Path, selected, rename_enabled: bool,
+                  settings, workers=0, metrics=_NULL_METRICS,
+                  json_style: str = "indented", verbose_log: bool = True,
+                  granularity: str = "texture",
+                  progress=_NULL_PROGRESS, priority=(),
+                  winners_only: bool = False, writer=_DISK,
+                  analyze_textures: bool = False) -> dict:
+    """Generate JSONs for *selected* mods into the JSON output mod.
+
+    *settings* is the generator settings dict, or an :class:`_EntryBuilder`
+    already compiled from one.  *analyze_textures* compiles the settings
+    with texture analysis, which needs NumPy; without it the run goes on
+    unanalysed and ``analysis_skipped`` is set.  Returns the summed
+    ``created``/``updated``/``unchanged``/``removed``/``errors`` counters
+    plus ``conflicts`` and ``analysis_skipped``.
+    Per-mod timings are appended to each mod's log and merged into
+    *metrics* when it is enabled.  Without *verbose_log* the logs keep
+    errors and totals but no per-file lines.  *granularity* is one of
+    :data:`OUTPUT_GRANULARITIES`.  Mods and files are reported to
+    *progress*, which can cancel the run between files.
+
+    The texture paths of every selected mod are scanned up front; each mod
+    rescans its own texture sets when its turn comes.  Textures that
+    several selected mods provide are listed in ``conflict_report.txt`` with the winner by
+    *priority* (see :func:`_texture_conflicts`); with *winners_only* the
+    losing mods get no entry for them.  An empty *priority* names no
+    winner and *winners_only* is then ignored.  Every write and removal goes
+    through *writer*; pass a :class:`_Plan` for a dry run.  A real run
+    writes into a staging folder that then replaces the output mod (see
+    :func:`_staged_output`).
+    """
+    with metrics.phase("total"):
+        selected = list(selected)
+        with _staged_output(mods_path, OUTPUT_MOD_NAME, selected, writer,
+                            metrics) as output_mod:
+            _ensure_output_mod(output_mod, writer)
+            totals = dict.fromkeys(
+                ("created", "updated", "unchanged", "removed", "errors"), 0
+            )
 
-# ---------------------------------------------------------------------------
-# Constants
-# ---------------------------------------------------------------------------
+            analysis_skipped = (
+                analyze_textures and _load_numpy() is None
+            )
+            builder = settings
+            if not isinstance(builder, _EntryBuilder):
+                builder = _EntryBuilder(
+                    settings, analyze_textures and not analysis_skipped
+                )
+            workers = _resolve_worker_count(workers)
+
+            conflicts = {}
+            if len(selected) > 1:
+                with metrics.phase("conflicts"):
+                    conflicts = _texture_conflicts(
+                        list(zip(selected, _map_units(
+                            _texture_paths,
+                            [(base_path,) for base_path in selected],
+                            workers,
+                        ))),
+                        priority,
+                    )
+            report = output_mod / "conflict_report.txt"
+            if conflicts:
+                writer.write_text(report, "\n".join(
+                    _conflict_report_lines(
+                        conflicts, winners_only, bool(priority)
+                    )
+                ))
+            elif report.exists():
+                writer.remove(report)
+            losing = {}
+            if winners_only and priority:
+                for key, providers in conflicts.items():
+                    for mod_folder, _ in providers[:-1]:
+                        losing.setdefault(mod_folder, set()).add(key)
+
+            units = [
+                (base_path, output_mod, rename_enabled, builder,
+                 metrics.enabled, json_style, verbose_log, granularity,
+                 progress, losing.get(base_path, frozenset()), writer)
+                for base_path in selected
+            ]
+            for result in _map_units(_generate_mod, units, workers):
+                for key in totals:
+                    totals[key] += result[key]
+                metrics.merge(result["metrics"])
+            totals["conflicts"] = len(conflicts)
+            totals["analysis_skipped"] = analysis_skipped
+    return totals
+
+
+def _generate_summary(totals: dict, metrics=_NULL_METRICS,
+                      cancelled: bool = False) -> str:
+    return _with_metrics(metrics, (
+        f"{'Generation cancelled' if cancelled else 'Generation complete'}"
+        f".\n\n"
+        f"Created:   {totals['created']}\n"
+        f"Updated:   {totals['updated']}\n"
+        f"Unchanged: {totals['unchanged']}\n"
+        f"Removed:   {totals['removed']}\n"
+        f"Errors:    {totals['errors']}"
+        + (
+            f"\nConflicts: {totals['conflicts']} textures in several mods "
+            "(see conflict_report.txt)" if totals.get("conflicts") else ""
+        )
+        + (
+            "\n\nTexture analysis skipped: NumPy is not installed."
+            if totals.get("analysis_skipped") else ""
+        )
+    ))
+
+
+def _run_update(mods_path: Path, selected, rename_enabled: bool,
+                processes=1, python_executable: str = "",
+                metrics=_NULL_METRICS, json_style: str = "indented",
+                verbose_log: bool = True, progress=_NULL_PROGRESS,
+                index_mods=None, writer=_DISK) -> dict:
+    """Rewrite texture paths of *selected* mods' PBRNifPatcher JSONs.
+
+    Entries are resolved against each mod's own ``Textures/PBR`` or, given
+    *index_mods* (mod folders in MO2 priority order, lowest first), against
+    one index over all of those built once for the run; selected mods
+    missing from *index_mods* are indexed below them.  Returns the
+    ``mods``/``jsons``/``updated``/``copied``/``unchanged``/``errors``
+    counters.  Per-mod timings are appended to each mod's log and merged
+    into *metrics* when it is enabled.  Without *verbose_log* the logs keep
+    errors, warnings and totals but no per-file lines.  Cancelling
+    *progress* stops before the next file; files already written stay as
+    they are.  Outputs go through *writer*; a dry run's :class:`_Plan`
+    always runs in this process.  A real run writes into a staging folder
+    that then replaces the output mod (see :func:`_staged_output`).
+    """
+    start = time.perf_counter()
+    stats = {
+        "mods": 0,
+        "jsons": 0,
+        "updated": 0,
+        "copied": 0,
+        "unchanged": 0,
+        "errors": 0,
+    }
+    selected = list(selected)
+    with _staged_output(mods_path, EXISTING_OUTPUT_MOD_NAME, selected,
+                        writer, metrics) as output_mod:
+        _ensure_output_mod(output_mod, writer)
+
+        shared_index = None
+        if index_mods is not None:
+            index_mods = list(index_mods)
+            listed = set(index_mods)
+            index_mods[:0] = [m for m in selected if m not in listed]
+            shared_index = _build_global_index(index_mods, metrics)
+
+        pool = None
+        previous_executable = None
+        if processes != 1 and not writer.dry_run:
+            import multiprocessing.spawn
+
+            # The pool sets the interpreter-wide spawn executable, which
+            # other MO2 plugins share; put it back once the pool is done.
+            previous_executable = multiprocessing.spawn.get_executable()
+            pool = _open_process_pool(
+                _resolve_worker_count(processes), python_executable,
+                shared_index,
+            )
 
-PLUGIN_NAME = "PBR Json Generator"
-SKIP_KEYWORDS = ("texgen", "dyndolod")
-PBR_TEX_REL = Path("Textures") / "PBR"
-PATCHER_DIR = "PBRNifPatcher"
-OUTPUT_MOD_NAME = "PBR JSON Output"
-EXISTING_OUTPUT_MOD_NAME = "PBR Existing JSON Output"
-META_INI_CONTENT = (
-    "[General]\n"
-    "managed=false\n"
-    "version=1.0.0\n"
-    "modid=0\n"
-    "category=0\n"
-)
+        try:
+            if pool is None:
+                units = (
+                    _ModUpdate(mod_folder, output_mod, rename_enabled,
+                               instrument=metrics.enabled,
+                               json_style=json_style, verbose_log=verbose_log,
+                               shared_index=shared_index, writer=writer)
+                    for mod_folder in selected
+                )
+            else:
+                # Queue every mod before collecting so workers stay busy
+                # while the next mod's rmaos index is being built.
+                units = []
+                for mod_folder in selected:
+                    unit = _ModUpdate(mod_folder, output_mod, rename_enabled,
+                                      instrument=metrics.enabled,
+                                      json_style=json_style,
+                                      verbose_log=verbose_log,
+                                      shared_index=shared_index)
+                    unit.submit(pool)
+                    units.append(unit)
+
+            for unit in units:
+                if progress.cancelled and pool is None:
+                    break
+                with writer.log(unit.out_root / "update_log.txt") as mod_log:
+                    json_touched = False
+                    mod_unchanged = 0
+                    processed = 0
+                    for result in unit.results(progress):
+                        processed += 1
+                        mod_log.extend(result["log"])
+                        stats["errors"] += result["errors"]
+                        if result["wrote"]:
+                            stats["updated"] += result["updated"]
+                            stats["copied"] += result["copied"]
+                            stats["jsons"] += 1
+                            json_touched = True
+                            if result["unchanged"]:
+                                mod_unchanged += 1
+
+                    if json_touched:
+                        stats["mods"] += 1
+                        stats["unchanged"] += mod_unchanged
+                        if mod_unchanged:
+                            mod_log.write(f"{mod_unchanged} files unchanged")
+                        if processed < unit.file_count:
+                            mod_log.write(
+                                f"Cancelled: {processed} of {unit.file_count} "
+                                "JSONs processed"
+                            )
+                        mod_log.extend(unit.metrics.report_lines())
+                    else:
+                        mod_log.discard()
+                metrics.merge(unit.metrics)
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=progress.cancelled)
+            if previous_executable is not None:
+                multiprocessing.spawn.set_executable(previous_executable)
+    metrics.add_time("total", time.perf_counter() - start)
+    return stats
+
+
+def _update_summary(stats: dict, metrics=_NULL_METRICS,
+                    cancelled: bool = False) -> str:
+    return _with_metrics(metrics, (
+        f"{'Update cancelled' if cancelled else 'Update complete'}.\n\n"
+        f"Mods processed:  {stats['mods']}\n"
+        f"JSON files:      {stats['jsons']}\n"
+        f"Entries updated: {stats['updated']}\n"
+        f"Entries copied:  {stats['copied']}\n"
+        f"JSONs unchanged: {stats['unchanged']}\n"
+        f"Errors:          {stats['errors']}"
+    ))
+
+
+def _with_metrics(metrics, summary: str) -> str:
+    """Append the run's timing report to a summary when instrumented."""
+    return "\n".join([summary] + metrics.report_lines())
 
 
 # ---------------------------------------------------------------------------
-# Helpers
+# Dialogs
 # ---------------------------------------------------------------------------
 
-def _rename_texture(texture_str: str):
-    """Strip a trailing ``_d`` diffuse suffix and return the renamed path.
+def _is_checked(value) -> bool:
+    """True for a checked check state, whichever binding delivered it."""
+    return getattr(value, "value", value) == 2
 
-    Returns *None* when the texture does not end with ``_d``.
+
+class _ModSearchIndex:
+    """Mod names normalised once for the selection dialogs' search bar.
+
+    A query is split into whitespace-separated terms and a name matches
+    when every term does, case-insensitively: as an in-order subsequence
+    that stays within one word of the name (a plain substring included;
+    ``"txtr"`` finds "Textures"), or as a prefix of the initials of the
+    name's words (``"sos"`` finds "Skyrim Overhaul Shaders").  Both only
+    get stricter as a term grows, so a query that extends the previous one
+    only rescans the previous matches.
     """
-    if texture_str.endswith("_d"):
-        return texture_str[:-2]
-    return None
+
+    _WORD = re.compile(r"[^\W_]+")
+    # Letters skipped between a term's characters, inside one word only.
+    _GAP = r"[^\W_]*?"
+
+    def __init__(self, names):
+        self._names = [name.lower() for name in names]
+        self._initials = [
+            "".join(word[0] for word in self._WORD.findall(name))
+            for name in self._names
+        ]
+        self._last_query = ""
+        self._last_rows = list(range(len(self._names)))
+
+    def search(self, query: str) -> list:
+        """Return the matching rows, in order, for *query*."""
+        query = query.lower()
+        if query.startswith(self._last_query):
+            candidates = self._last_rows
+        else:
+            candidates = range(len(self._names))
+        rows = list(candidates)
+        for term in query.split():
+            pattern = re.compile(self._GAP.join(map(re.escape, term)))
+            rows = [
+                row for row in rows
+                if pattern.search(self._names[row])
+                or self._initials[row].startswith(term)
+            ]
+        self._last_query = query
+        self._last_rows = rows
+        return rows
+
+
+class _ModFilterProxyMixin:
+    """Shows the source rows last handed to :meth:`set_rows`."""
+
+    def __init__(self, parent=None):
+        self._accepted = None
+        super().__init__(parent)
+
+    def set_rows(self, rows):
+        """Accept only *rows* (``None`` accepts every row)."""
+        if rows is None:
+            self._accepted = None
+        else:
+            self._accepted = bytearray(self.sourceModel().rowCount())
+            for row in rows:
+                self._accepted[row] = 1
+        self.invalidateFilter()
+
+    def filterAcceptsRow(self, row, parent):
+        return self._accepted is None or bool(self._accepted[row])
 
 
-def _build_rmaos_index(pbr_folder: Path) -> dict:
-    """Build a {normalised_stem: Path} lookup for every ``*_rmaos.dds`` file.
+class _ModListModelMixin:
+    """Checkable list of mod folders.
 
-    Keys are lower-cased, forward-slash paths relative to *pbr_folder* with
-    the ``_rmaos.dds`` suffix removed (e.g. ``landscape/dirt``).
+    Check state is kept here rather than in view items, so filtering the
+    view through a proxy neither rebuilds rows nor forgets which mods were
+    checked.
     """
-    index = {}
-    for dds in pbr_folder.rglob("*_rmaos.dds"):
-        rel = dds.relative_to(pbr_folder)
-        key = str(rel).replace("\\", "/").lower()
-        key = key[: -len("_rmaos.dds")]
-        index[key] = dds
-    return index
 
+    def __init__(self, mods, parent=None):
+        super().__init__(parent)
+        self._mods = list(mods)
+        self._names = [m.name for m in self._mods]
+        self._checked = [False] * len(self._mods)
+
+    def rowCount(self, parent=None):
+        if parent is not None and parent.isValid():
+            return 0
+        return len(self._mods)
+
+    def data(self, index, role=None):
+        if not index.isValid():
+            return None
+        if role is None:
+            role = DISPLAY_ROLE
+        row = index.row()
+        if role == DISPLAY_ROLE:
+            return self._names[row]
+        if role == CHECK_STATE_ROLE:
+            return CHECKED if self._checked[row] else UNCHECKED
+        if role == USER_ROLE:
+            return self._mods[row]
+        return None
+
+    def flags(self, index):
+        if not index.isValid():
+            return super().flags(index)
+        return ITEM_IS_SELECTABLE | ITEM_IS_USER_CHECKABLE | ITEM_IS_ENABLED
+
+    def setData(self, index, value, role=None):
+        if role is None:
+            role = CHECK_STATE_ROLE
+        if not index.isValid() or role != CHECK_STATE_ROLE:
+            return False
+        self._checked[index.row()] = _is_checked(value)
+        self.dataChanged.emit(index, index)
+        return True
+
+    def set_checked(self, rows, checked: bool):
+        """Check or uncheck *rows* with a single ``dataChanged``."""
+        rows = [row for row in rows if self._checked[row] != checked]
+        if not rows:
+            return
+        for row in rows:
+            self._checked[row] = checked
+        self.dataChanged.emit(self.index(min(rows)), self.index(max(rows)))
+
+    def checked_mods(self) -> list:
+        return [
+            mod for mod, checked in zip(self._mods, self._checked) if checked
+        ]
 
-# ---------------------------------------------------------------------------
-# Dialogs
-# ---------------------------------------------------------------------------
 
-class BaseModSelectionDialog(QDialog):
+class _BaseModSelectionDialogMixin:
     """Reusable dialog: search bar, select-all, rename checkbox, mod list."""
 
     def __init__(self, mods, title, parent=None):
@@ -304,16 +3333,27 @@ class BaseModSelectionDialog(QDialog):
         self.setMinimumHeight(500)
 
         self.mods = sorted(mods, key=lambda m: m.name.lower())
-        self.filtered_mods = list(self.mods)
+        self.mod_model = _ModListModel(self.mods, self)
+        self.filter_model = _ModFilterProxy(self)
+        self.filter_model.setSourceModel(self.mod_model)
+        self.search_index = _ModSearchIndex(m.name for m in self.mods)
 
         self.main_layout = QVBoxLayout(self)
 
         # Search
         self.main_layout.addWidget(QLabel("Search mods by name:"))
         self.mod_search_bar = QLineEdit(self)
-        self.mod_search_bar.textChanged.connect(self._filter_mods)
         self.main_layout.addWidget(self.mod_search_bar)
 
+        # Filter once typing pauses instead of on every keystroke.
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(SEARCH_DEBOUNCE_MS)
+        self.search_timer.timeout.connect(self._filter_mods)
+        self.mod_search_bar.textChanged.connect(
+            lambda _text: self.search_timer.start()
+        )
+
         # Select all
         self.select_all_checkbox = QCheckBox("Select All")
         self.select_all_checkbox.clicked.connect(self._handle_select_all)
@@ -331,9 +3371,10 @@ class BaseModSelectionDialog(QDialog):
         self.count_label = QLabel(f"{len(self.mods)} mods found")
         self.main_layout.addWidget(self.count_label)
 
-        self.list_widget = QListWidget(self)
-        self._populate_mod_list(self.filtered_mods)
-        self.main_layout.addWidget(self.list_widget)
+        self.list_view = QListView(self)
+        self.list_view.setUniformItemSizes(True)
+        self.list_view.setModel(self.filter_model)
+        self.main_layout.addWidget(self.list_view)
 
         buttons = QDialogButtonBox(
             QDialogButtonBox.StandardButton.Ok
@@ -346,45 +3387,38 @@ class BaseModSelectionDialog(QDialog):
     # -- Slots ----------------------------------------------------------------
 
     def _filter_mods(self):
-        search_text = self.mod_search_bar.text().lower()
-        self.filtered_mods = [
-            m for m in self.mods if search_text in m.name.lower()
-        ]
-        self.list_widget.clear()
-        self._populate_mod_list(self.filtered_mods)
+        query = self.mod_search_bar.text()
+        self.filter_model.set_rows(
+            self.search_index.search(query) if query.strip() else None
+        )
         self.count_label.setText(
-            f"Showing {len(self.filtered_mods)} of {len(self.mods)} mods"
+            f"Showing {self.filter_model.rowCount()} of {len(self.mods)} mods"
         )
 
-    def _populate_mod_list(self, mods):
-        for mod_folder in mods:
-            item = QListWidgetItem(mod_folder.name)
-            item.setData(USER_ROLE, mod_folder)
-            item.setFlags(
-                item.flags() | ITEM_IS_USER_CHECKABLE | ITEM_IS_ENABLED
-            )
-            item.setCheckState(UNCHECKED)
-            self.list_widget.addItem(item)
+    def _visible_rows(self):
+        """Source-model rows of the mods that pass the current filter."""
+        proxy = self.filter_model
+        return [
+            proxy.mapToSource(proxy.index(row, 0)).row()
+            for row in range(proxy.rowCount())
+        ]
 
     def _handle_select_all(self):
-        state = CHECKED if self.select_all_checkbox.isChecked() else UNCHECKED
-        for i in range(self.list_widget.count()):
-            self.list_widget.item(i).setCheckState(state)
+        self.mod_model.set_checked(
+            self._visible_rows(), self.select_all_checkbox.isChecked()
+        )
 
     # -- Public API -----------------------------------------------------------
 
     def get_selected_mods(self):
-        return [
-            self.list_widget.item(i).data(USER_ROLE)
-            for i in range(self.list_widget.count())
-            if self.list_widget.item(i).checkState() == CHECKED
-        ]
+        """Checked mods, including ones hidden by the current filter."""
+        return self.mod_model.checked_mods()
 
     def is_rename_enabled(self):
         return self.rename_checkbox.isChecked()
 
 
-class ModSelectionDialog(BaseModSelectionDialog):
+class _ModSelectionDialogMixin(_BaseModSelectionDialogMixin):
     """Mod-selection dialog with an extra *update existing only* option."""
 
     def __init__(self, mods, parent=None):
@@ -398,21 +3432,28 @@ class ModSelectionDialog(BaseModSelectionDialog):
         )
         self.main_layout.addWidget(self.update_existing_checkbox)
 
+        self.dry_run_checkbox = QCheckBox(
+            "Dry run: only show what would change"
+        )
+        self.main_layout.addWidget(self.dry_run_checkbox)
+
         self._finish_layout()
 
     def _toggle_mod_selection(self):
         enabled = not self.update_existing_checkbox.isChecked()
-        self.list_widget.setEnabled(enabled)
+        self.list_view.setEnabled(enabled)
         self.select_all_checkbox.setEnabled(enabled)
         if not enabled:
-            for i in range(self.list_widget.count()):
-                self.list_widget.item(i).setCheckState(UNCHECKED)
+            self.mod_model.set_checked(range(len(self.mods)), False)
 
     def is_update_existing_only(self):
         return self.update_existing_checkbox.isChecked()
 
+    def is_dry_run(self):
+        return self.dry_run_checkbox.isChecked()
 
-class PBRNifPatcherSelectionDialog(BaseModSelectionDialog):
+
+class _PBRNifPatcherSelectionDialogMixin(_BaseModSelectionDialogMixin):
     """Simpler dialog for mods that already contain PBRNifPatcher folders."""
 
     def __init__(self, mods, parent=None):
@@ -422,7 +3463,7 @@ class PBRNifPatcherSelectionDialog(BaseModSelectionDialog):
         self._finish_layout()
 
 
-class PBRSettingsDialog(QDialog):
+class _PBRSettingsDialogMixin:
     """Dialog for configuring which PBR JSON fields to include and their
     default values.  Organised in tabs matching the PGPatcher wiki sections.
     """
@@ -641,11 +3682,39 @@ class PBRSettingsDialog(QDialog):
         return result
 
 
+# Concrete classes built by _load_ui(): (name, implementation, Qt base).
+_UI_CLASSES = (
+    ("_ModListModel", _ModListModelMixin, "QAbstractListModel"),
+    ("_ModFilterProxy", _ModFilterProxyMixin, "QSortFilterProxyModel"),
+    ("ModSelectionDialog", _ModSelectionDialogMixin, "QDialog"),
+    ("PBRNifPatcherSelectionDialog", _PBRNifPatcherSelectionDialogMixin,
+     "QDialog"),
+    ("PBRSettingsDialog", _PBRSettingsDialogMixin, "QDialog"),
+)
+
+
+def _load_ui():
+    """Resolve Qt and build the model and dialog classes, once.
+
+    The classes above are Qt-free mixins so defining them costs nothing at
+    MO2 startup; here each is combined with its Qt base class and published
+    under its public name.
+    """
+    _load_qt()
+    namespace = globals()
+    for name, mixin, base in _UI_CLASSES:
+        if name not in namespace:
+            namespace[name] = type(name, (mixin, namespace[base]), {
+                "__module__": __name__,
+                "__doc__": mixin.__doc__,
+            })
+
+
 # ---------------------------------------------------------------------------
 # Plugin
 # ---------------------------------------------------------------------------
 
-class PBRJsonGenerator(mobase.IPluginTool):
+class PBRJsonGenerator(mobase.IPluginTool if mobase else object):
     def __init__(self):
         super().__init__()
         self.__organizer = None
@@ -653,7 +3722,7 @@ class PBRJsonGenerator(mobase.IPluginTool):
 
     # -- mobase boilerplate ---------------------------------------------------
 
-    def init(self, organizer: mobase.IOrganizer) -> bool:
+    def init(self, organizer: "mobase.IOrganizer") -> bool:
         self.__organizer = organizer
         return True
 
@@ -676,7 +3745,85 @@ class PBRJsonGenerator(mobase.IPluginTool):
         return True
 
     def settings(self):
-        return []
+        return [
+            mobase.PluginSetting(
+                "generate_workers",
+                "Number of mods processed in parallel when generating "
+                "JSONs (0 = one per CPU core, 1 = serial)",
+                0,
+            ),
+            mobase.PluginSetting(
+                "update_processes",
+                "Worker processes used to update existing JSONs (1 = run "
+                "inside MO2, 0 = one per CPU core)",
+                1,
+            ),
+            mobase.PluginSetting(
+                "python_executable",
+                "Python interpreter for update worker processes (needed "
+                "when update_processes is not 1, same version as MO2's)",
+                "",
+            ),
+            mobase.PluginSetting(
+                "winning_entries_only",
+                "When several selected mods provide the same texture, "
+                "generate its JSON only for the mod that wins in MO2's load "
+                "order",
+                False,
+            ),
+            mobase.PluginSetting(
+                "global_index",
+                "When updating existing JSONs, resolve textures against "
+                "every enabled mod's Textures/PBR in load order, not only "
+                "the mod's own",
+                False,
+            ),
+            mobase.PluginSetting(
+                "analyze_textures",
+                "Read a small mip level of each _rmaos and _g texture (needs "
+                "NumPy) to clamp roughness_scale and leave emissive off for "
+                "black glow maps",
+                False,
+            ),
+            mobase.PluginSetting(
+                "force_rescan",
+                "Ignore the cached mod discovery results on the next run "
+                "and probe every mod folder again (resets itself)",
+                False,
+            ),
+            mobase.PluginSetting(
+                "instrumentation",
+                "Record per-phase timings and I/O counters in the run logs "
+                "and the completion summary",
+                False,
+            ),
+            mobase.PluginSetting(
+                "json_style",
+                "Layout of written JSON files: 'indented' (4 spaces) or "
+                "'compact' (no whitespace, uses orjson when installed)",
+                "indented",
+            ),
+            mobase.PluginSetting(
+                "output_granularity",
+                "What each generated JSON covers: 'texture' (one file per "
+                "_rmaos.dds), 'directory' or 'mod' (one multi-entry file)",
+                "texture",
+            ),
+            mobase.PluginSetting(
+                "verbose_logs",
+                "Write a line per created, updated or copied file to the "
+                "generation/update logs (errors and totals are always "
+                "logged)",
+                True,
+            ),
+            mobase.PluginSetting(
+                "profile",
+                "Run under cProfile and tracemalloc and write profile.prof "
+                "and allocation reports into the output mod (runs serially, "
+                "much slower)",
+                False,
+            ),
+        ]
 
     def displayName(self):
         return PLUGIN_NAME
@@ -688,6 +3835,7 @@ class PBRJsonGenerator(mobase.IPluginTool):
         )
 
     def icon(self):
+        _load_qt()
         return QIcon()
 
     def setParentWidget(self, widget):
@@ -696,6 +3844,7 @@ class PBRJsonGenerator(mobase.IPluginTool):
     # -- Entry point ----------------------------------------------------------
 
     def display(self):
+        _load_ui()
         try:
             self._run()
         except Exception as e:
@@ -709,19 +3858,20 @@ class PBRJsonGenerator(mobase.IPluginTool):
 
     def _run(self):
         mods_path = Path(self.__organizer.modsPath())
-        mods_with_pbr = []
-        mods_with_patcher = []
-
-        for mod_folder in mods_path.iterdir():
-            if not mod_folder.is_dir():
-                continue
-            if any(kw in mod_folder.name.lower() for kw in SKIP_KEYWORDS):
-                continue
-            has_meta = (mod_folder / "meta.ini").exists()
-            if has_meta and (mod_folder / PBR_TEX_REL).exists():
-                mods_with_pbr.append(mod_folder)
-            if has_meta and (mod_folder / PATCHER_DIR).exists():
-                mods_with_patcher.append(mod_folder)
+        force_rescan = bool(self._plugin_setting("force_rescan", False))
+        metrics = _new_metrics(
+            bool(self._plugin_setting("instrumentation", False))
+        )
+        with metrics.phase("discovery"):
+            mods_with_pbr, mods_with_patcher = _discover_mods(
+                mods_path, self._discovery_cache_path(mods_path),
+                force_rescan, metrics,
+            )
+        if force_rescan:
+            # One-shot: the next launch uses the refreshed cache again.
+            self.__organizer.setPluginSetting(
+                self.name(), "force_rescan", False
+            )
 
         if not mods_with_pbr and not mods_with_patcher:
             QMessageBox.information(
@@ -735,9 +3885,15 @@ class PBRJsonGenerator(mobase.IPluginTool):
         dialog = ModSelectionDialog(mods_with_pbr, self.__parent_widget)
         if dialog.exec() != QDialog.DialogCode.Accepted:
             return
+        dry_run = dialog.is_dry_run()
+        if dry_run and not metrics.enabled:
+            # A plan always reports how long the scans took.
+            metrics = _new_metrics(True)
 
         if dialog.is_update_existing_only():
-            self._handle_update_existing(mods_path, mods_with_patcher)
+            self._handle_update_existing(
+                mods_path, mods_with_patcher, metrics, dry_run
+            )
         else:
             selected = dialog.get_selected_mods()
             rename = dialog.is_rename_enabled()
@@ -748,9 +3904,11 @@ class PBRJsonGenerator(mobase.IPluginTool):
             settings = settings_dialog.get_settings()
 
             self._handle_generate_new(
-                mods_path, selected, rename, settings
+                mods_path, selected, rename, settings, metrics, dry_run
             )
 
+        if dry_run:
+            return
         try:
             self.__organizer.refresh(True)
         except Exception:
@@ -758,7 +3916,8 @@ class PBRJsonGenerator(mobase.IPluginTool):
 
     # -- Update existing JSONs ------------------------------------------------
 
-    def _handle_update_existing(self, mods_path, mods_with_patcher):
+    def _handle_update_existing(self, mods_path, mods_with_patcher,
+                                metrics=_NULL_METRICS, dry_run=False):
         if not mods_with_patcher:
             QMessageBox.information(
                 self.__parent_widget,
@@ -767,11 +3926,18 @@ class PBRJsonGenerator(mobase.IPluginTool):
             )
             return
 
-        # Only show mods that have BOTH Textures/PBR and PBRNifPatcher,
-        # because we need PBR textures for the lookup.
-        eligible = [
-            m for m in mods_with_patcher if (m / PBR_TEX_REL).exists()
-        ]
+        # Without the global index only mods that have BOTH Textures/PBR
+        # and PBRNifPatcher are shown, because we need PBR textures for the
+        # lookup.  With it, JSON-only patches resolve against every enabled
+        # mod's textures.
+        index_mods = None
+        if bool(self._plugin_setting("global_index", False)):
+            index_mods = self._enabled_mods(mods_path)
+            eligible = list(mods_with_patcher)
+        else:
+            eligible = [
+                m for m in mods_with_patcher if (m / PBR_TEX_REL).exists()
+            ]
         if not eligible:
             QMessageBox.information(
                 self.__parent_widget,
@@ -797,141 +3963,40 @@ class PBRJsonGenerator(mobase.IPluginTool):
             )
             return
 
-        output_mod = self._ensure_output_mod(mods_path, EXISTING_OUTPUT_MOD_NAME)
-        stats = {
-            "mods": 0,
-            "jsons": 0,
-            "updated": 0,
-            "copied": 0,
-            "errors": 0,
-        }
-
-        for mod_folder in selected:
-            mod_pbr = mod_folder / PBR_TEX_REL
-            patcher = mod_folder / PATCHER_DIR
-
-            rmaos_index = _build_rmaos_index(mod_pbr)
-            mod_log = []
-            json_touched = False
-
-            for json_file in patcher.rglob("*.json"):
-                try:
-                    with open(json_file, "r", encoding="utf-8") as f:
-                        existing_data = json.load(f)
-                except (json.JSONDecodeError, OSError) as exc:
-                    mod_log.append(f"ERROR reading {json_file.name}: {exc}")
-                    stats["errors"] += 1
-                    continue
-
-                entries, is_wrapped = self._extract_entries(existing_data)
-                if entries is None:
-                    continue
-
-                new_entries = []
-                entries_updated = 0
-                entries_copied = 0
-
-                for entry in entries:
-                    if not (isinstance(entry, dict) and "texture" in entry):
-                        new_entries.append(entry)
-                        entries_copied += 1
-                        continue
-
-                    texture_key = (
-                        entry["texture"].replace("\\", "/").lower()
-                    )
-                    dds_file = rmaos_index.get(texture_key)
-
-                    # Fallback: match by filename only
-                    if dds_file is None:
-                        fname = texture_key.rsplit("/", 1)[-1]
-                        candidates = [
-                            v
-                            for k, v in rmaos_index.items()
-                            if k.rsplit("/", 1)[-1] == fname
-                        ]
-                        dds_file = candidates[0] if candidates else None
-
-                    if dds_file is not None:
-                        rel = dds_file.relative_to(mod_pbr)
-                        new_tex = str(
-                            rel.parent / rel.stem.replace("_rmaos", "")
-                        ).replace("/", "\\")
-
-                        new_entry = {"texture": new_tex}
-                        if rename_enabled:
-                            renamed = _rename_texture(new_tex)
-                            if renamed:
-                                new_entry["rename"] = renamed
-                                mod_log.append(
-                                    f"Renamed: {new_tex} -> {renamed}"
-                                )
-
-                        for k, v in entry.items():
-                            if k not in ("texture", "rename"):
-                                new_entry[k] = v
-
-                        new_entries.append(new_entry)
-                        entries_updated += 1
-                    else:
-                        new_entries.append(entry)
-                        entries_copied += 1
-                        mod_log.append(
-                            f"Copied unchanged: {entry['texture']} "
-                            "(no _rmaos.dds found)"
-                        )
-
-                if entries_updated > 0 or entries_copied > 0:
-                    if is_wrapped:
-                        output_data = {
-                            **existing_data,
-                            "entries": new_entries,
-                        }
-                    else:
-                        output_data = new_entries
-
-                    out_dir = (
-                        output_mod
-                        / mod_folder.name
-                        / PATCHER_DIR
-                        / json_file.relative_to(patcher).parent
-                    )
-                    out_dir.mkdir(parents=True, exist_ok=True)
-                    out_path = out_dir / json_file.name
-
-                    with open(out_path, "w", encoding="utf-8") as f:
-                        json.dump(output_data, f, indent=4)
-
-                    stats["updated"] += entries_updated
-                    stats["copied"] += entries_copied
-                    stats["jsons"] += 1
-                    json_touched = True
-                    mod_log.append(f"Wrote: {out_path.name}")
-
-            if json_touched:
-                stats["mods"] += 1
-                self._write_log(
-                    output_mod
-                    / mod_folder.name
-                    / PATCHER_DIR
-                    / "update_log.txt",
-                    mod_log,
+        profile = bool(self._plugin_setting("profile", False))
+        processes = 1 if profile else self._plugin_setting(
+            "update_processes", 1
+        )
+        python_executable = self._plugin_setting("python_executable", "")
+        json_style = _json_style(
+            self._plugin_setting("json_style", "indented")
+        )
+        verbose_log = bool(self._plugin_setting("verbose_logs", True))
+        output_mod = mods_path / EXISTING_OUTPUT_MOD_NAME
+        writer = _Plan(output_mod) if dry_run else _DISK
+        # A dry run must not create the output mod just for its reports.
+        profile_dir = self._data_path() if dry_run else output_mod
+
+        def work(progress):
+            with _profiling(profile_dir, profile):
+                return _run_update(
+                    mods_path, selected, rename_enabled, processes,
+                    python_executable, metrics, json_style, verbose_log,
+                    progress, index_mods, writer,
                 )
 
-        summary = (
-            f"Update complete.\n\n"
-            f"Mods processed:  {stats['mods']}\n"
-            f"JSON files:      {stats['jsons']}\n"
-            f"Entries updated: {stats['updated']}\n"
-            f"Entries copied:  {stats['copied']}\n"
-            f"Errors:          {stats['errors']}"
+        stats, progress = self._run_in_background(
+            "Updating PBR JSONs", len(selected), work
+        )
+        self._show_summary(
+            _update_summary(stats, metrics, progress.cancelled), writer
         )
-        QMessageBox.information(self.__parent_widget, PLUGIN_NAME, summary)
 
     # -- Generate new JSONs ---------------------------------------------------
 
     def _handle_generate_new(self, mods_path, selected, rename_enabled,
-                             settings):
+                             settings, metrics=_NULL_METRICS,
+                             dry_run=False):
         if not selected:
             QMessageBox.information(
                 self.__parent_widget,
@@ -940,197 +4005,320 @@ class PBRJsonGenerator(mobase.IPluginTool):
             )
             return
 
-        output_mod = self._ensure_output_mod(mods_path, OUTPUT_MOD_NAME)
-        total_files = 0
-        total_errors = 0
-
-        for base_path in selected:
-            mod_pbr = base_path / PBR_TEX_REL
-            out_root = output_mod / base_path.name / PATCHER_DIR
-            out_root.mkdir(parents=True, exist_ok=True)
-            mod_log = []
-            found_any = False
-
-            for dds_file in mod_pbr.rglob("*_rmaos.dds"):
-                found_any = True
-                rel = dds_file.relative_to(mod_pbr)
-                base_name = dds_file.stem.replace("_rmaos", "")
-                texture_str = str(rel.parent / base_name).replace("/", "\\")
-
-                parent_out = out_root / rel.parent
-                parent_out.mkdir(parents=True, exist_ok=True)
-                json_path = parent_out / f"{base_name}.json"
-
-                # If a JSON already exists, update the texture path only,
-                # preserving all other fields from the first entry.
-                if json_path.exists():
-                    try:
-                        with open(json_path, "r", encoding="utf-8") as f:
-                            existing_data = json.load(f)
-                    except (json.JSONDecodeError, OSError) as exc:
-                        mod_log.append(
-                            f"ERROR reading {json_path.name}: {exc}"
-                        )
-                        total_errors += 1
-                        continue
-
-                    if isinstance(existing_data, list) and existing_data:
-                        new_entry = {"texture": texture_str}
-                        if rename_enabled:
-                            renamed = _rename_texture(texture_str)
-                            if renamed:
-                                new_entry["rename"] = renamed
-                                mod_log.append(
-                                    f"Renamed: {texture_str} -> {renamed}"
-                                )
-
-                        for k, v in existing_data[0].items():
-                            if k not in ("texture", "rename"):
-                                new_entry[k] = v
-
-                        with open(json_path, "w", encoding="utf-8") as f:
-                            json.dump([new_entry], f, indent=4)
-                        mod_log.append(f"Updated: {json_path.name}")
-                        total_files += 1
-                        continue
-
-                # Probe for companion textures next to the _rmaos file.
-                parent_dir = dds_file.parent
-                glow = (parent_dir / f"{base_name}_g.dds").exists()
-                fuzz = (parent_dir / f"{base_name}_f.dds").exists()
-                parallax = (parent_dir / f"{base_name}_p.dds").exists()
-                subsurface = (parent_dir / f"{base_name}_s.dds").exists()
-                cnr = (parent_dir / f"{base_name}_cnr.dds").exists()
-
-                entry = {"texture": texture_str}
-                if rename_enabled:
-                    renamed = _rename_texture(texture_str)
-                    if renamed:
-                        entry["rename"] = renamed
-                        mod_log.append(
-                            f"Renamed: {texture_str} -> {renamed}"
-                        )
-
-                # Auto-detected features
-                entry["emissive"] = glow
-                entry["parallax"] = parallax
-                entry["subsurface"] = subsurface
-
-                # User-configured general settings
-                for key in ("specular_level", "roughness_scale",
-                            "smooth_angle", "subsurface_foliage",
-                            "vertex_colors", "vertex_color_lum_mult",
-                            "vertex_color_sat_mult", "zbuffer_write",
-                            "auto_uv", "uv_scale"):
-                    if key in settings:
-                        entry[key] = settings[key]
-
-                # Emissive extras (only when detected)
-                if glow:
-                    for key in ("emissive_scale", "emissive_color"):
-                        if key in settings:
-                            entry[key] = settings[key]
-
-                # Parallax extras (only when detected)
-                if parallax:
-                    if "displacement_scale" in settings:
-                        entry["displacement_scale"] = (
-                            settings["displacement_scale"]
-                        )
-
-                # Subsurface extras (only when detected)
-                if subsurface:
-                    for key in ("subsurface_color", "subsurface_opacity"):
-                        if key in settings:
-                            entry[key] = settings[key]
-
-                # Fuzz or Coat (mutually exclusive, fuzz wins)
-                if fuzz:
-                    fuzz_obj = {"texture": True}
-                    if "fuzz_color" in settings:
-                        fuzz_obj["color"] = settings["fuzz_color"]
-                    if "fuzz_weight" in settings:
-                        fuzz_obj["weight"] = settings["fuzz_weight"]
-                    entry["fuzz"] = fuzz_obj
-                elif subsurface and cnr:
-                    entry["coat_normal"] = True
-                    for key in ("coat_diffuse", "coat_parallax",
-                                "coat_strength", "coat_roughness",
-                                "coat_specular_level"):
-                        if key in settings:
-                            entry[key] = settings[key]
-
-                # Hair
-                if "hair" in settings:
-                    entry["hair"] = settings["hair"]
-
-                # Glint
-                _glint_map = {
-                    "glint_screen_space_scale": "screen_space_scale",
-                    "glint_log_microfacet_density":
-                        "log_microfacet_density",
-                    "glint_microfacet_roughness": "microfacet_roughness",
-                    "glint_density_randomization":
-                        "density_randomization",
-                }
-                _glint = {}
-                for s_key, j_key in _glint_map.items():
-                    if s_key in settings:
-                        _glint[j_key] = settings[s_key]
-                if _glint:
-                    entry["glint"] = _glint
-
-                with open(json_path, "w", encoding="utf-8") as f:
-                    json.dump([entry], f, indent=4)
-                mod_log.append(f"Created: {json_path.name}")
-                total_files += 1
-
-            if not found_any:
-                mod_log.append(
-                    f"Skipped {base_path.name}: "
-                    "no *_rmaos.dds in Textures/PBR"
+        profile = bool(self._plugin_setting("profile", False))
+        workers = 1 if profile else self._plugin_setting(
+            "generate_workers", 0
+        )
+        json_style = _json_style(
+            self._plugin_setting("json_style", "indented")
+        )
+        verbose_log = bool(self._plugin_setting("verbose_logs", True))
+        granularity = _output_granularity(
+            self._plugin_setting("output_granularity", "texture")
+        )
+        winners_only = bool(
+            self._plugin_setting("winning_entries_only", False)
+        )
+        analyze = bool(self._plugin_setting("analyze_textures", False))
+        priority = [m.name for m in self._enabled_mods(mods_path)]
+        if winners_only and not priority:
+            QMessageBox.information(
+                self.__parent_widget,
+                PLUGIN_NAME,
+                "The current profile's load order could not be read, so "
+                "Winning entries only is off for this run: every selected "
+                "mod gets its own entries.",
+            )
+            winners_only = False
+        output_mod = mods_path / OUTPUT_MOD_NAME
+        writer = _Plan(output_mod) if dry_run else _DISK
+        # A dry run must not create the output mod just for its reports.
+        profile_dir = self._data_path() if dry_run else output_mod
+
+        def work(progress):
+            with _profiling(profile_dir, profile):
+                return _run_generate(
+                    mods_path, selected, rename_enabled, settings, workers,
+                    metrics, json_style, verbose_log, granularity, progress,
+                    priority, winners_only, writer, analyze,
                 )
 
-            self._write_log(out_root / "generation_log.txt", mod_log)
-
-        summary = (
-            f"Generation complete.\n\n"
-            f"Files processed: {total_files}\n"
-            f"Errors:          {total_errors}"
+        totals, progress = self._run_in_background(
+            "Generating PBR JSONs", len(selected), work
+        )
+        self._show_summary(
+            _generate_summary(totals, metrics, progress.cancelled), writer
         )
+
+    def _show_summary(self, summary: str, writer):
+        """Report a finished run; a dry run's plan is saved first."""
+        if writer.dry_run:
+            plan_path = self._data_path() / "dry_run_plan.txt"
+            _write_log(plan_path, writer.report_lines())
+            summary = (
+                f"Dry run: nothing was written.\n"
+                f"Plan with diffs: {plan_path}\n\n{summary}"
+            )
         QMessageBox.information(self.__parent_widget, PLUGIN_NAME, summary)
 
-    # -- Utilities ------------------------------------------------------------
+    # -- Background runs ------------------------------------------------------
+
+    def _run_in_background(self, title, mods_total, work):
+        """Run ``work(progress)`` on a worker thread behind a progress dialog.
 
-    @staticmethod
-    def _ensure_output_mod(mods_path: Path, name: str) -> Path:
-        """Create the output mod folder with a ``meta.ini`` if needed."""
-        mod = mods_path / name
-        mod.mkdir(exist_ok=True)
-        meta = mod / "meta.ini"
-        if not meta.exists():
-            meta.write_text(META_INI_CONTENT, encoding="utf-8")
-        return mod
-
-    @staticmethod
-    def _extract_entries(data):
-        """Return ``(entries_list, is_wrapped_in_dict)`` or ``(None, None)``.
-
-        Handles both ``{"entries": [...]}`` and plain ``[...]`` formats.
+        The UI thread only polls the shared :class:`_Progress`, so MO2 stays
+        responsive; Cancel asks the engines to stop after the files in
+        flight.  Returns ``(result, progress)`` and re-raises whatever
+        *work* raised.
         """
-        if isinstance(data, dict) and "entries" in data:
-            entries = data["entries"]
-            if isinstance(entries, list) and entries:
-                return entries, True
-        elif isinstance(data, list) and data:
-            return data, False
-        return None, None
+        progress = _Progress(mods_total)
+        outcome = {}
+
+        def target():
+            try:
+                outcome["result"] = work(progress)
+            except BaseException as e:
+                outcome["error"] = e
+
+        dialog = QProgressDialog(
+            "Starting...", "Cancel", 0, PROGRESS_STEPS, self.__parent_widget
+        )
+        dialog.setWindowTitle(title)
+        dialog.setWindowModality(WINDOW_MODAL)
+        dialog.setMinimumDuration(0)
+        dialog.setAutoClose(False)
+        dialog.setAutoReset(False)
+        dialog.show()
+
+        worker = threading.Thread(target=target, name=title, daemon=True)
+        worker.start()
+        try:
+            while worker.is_alive():
+                if dialog.wasCanceled() and not progress.cancelled:
+                    progress.cancel()
+                    # Qt hides the dialog on cancel; keep it up until the
+                    # worker has stopped.
+                    dialog.show()
+                dialog.setLabelText(progress.describe())
+                dialog.setValue(int(progress.fraction() * PROGRESS_STEPS))
+                QApplication.processEvents()
+                worker.join(PROGRESS_POLL_SECONDS)
+        except BaseException:
+            # Never leave the worker writing behind a failed dialog.
+            progress.cancel()
+            worker.join()
+            raise
+        finally:
+            dialog.close()
+
+        if "error" in outcome:
+            raise outcome["error"]
+        return outcome["result"], progress
+
+    # -- Utilities ------------------------------------------------------------
+
+    def _data_path(self) -> Path:
+        """Folder for this plugin's caches inside MO2's plugin data folder."""
+        try:
+            base = Path(self.__organizer.getPluginDataPath())
+        except AttributeError:
+            base = Path(__file__).resolve().parent / "data"
+        return base / "pbr_json_generator"
+
+    def _discovery_cache_path(self, mods_path: Path) -> Path:
+        digest = hashlib.sha1(
+            str(mods_path).lower().encode("utf-8")
+        ).hexdigest()[:12]
+        return self._data_path() / f"discovery_cache_{digest}.json"
+
+    def _enabled_mods(self, mods_path: Path) -> list:
+        """Enabled mod folders of the current profile, lowest priority
+        first; empty if the profile's mod list cannot be read."""
+        modlist = Path(self.__organizer.profilePath()) / "modlist.txt"
+        try:
+            names = _read_modlist(modlist)
+        except OSError:
+            return []
+        return [mods_path / name for name in names]
+
+    def _plugin_setting(self, key, default):
+        """Read one of this plugin's MO2 settings, falling back to *default*."""
+        if self.__organizer is None:
+            return default
+        value = self.__organizer.pluginSetting(self.name(), key)
+        return default if value is None else value
+
+
+# ---------------------------------------------------------------------------
+# Command line
+# ---------------------------------------------------------------------------
+
+def _build_arg_parser():
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog="pbr_json_generator.py",
+        description=(
+            "Generate or update PBRNifPatcher JSONs for an MO2 mods folder "
+            "without MO2."
+        ),
+    )
+    parser.add_argument("mode", choices=("generate", "update"))
+    parser.add_argument("--mods-path", required=True, type=Path,
+                        help="MO2 mods directory")
+    parser.add_argument("--mod", action="append", default=[], dest="mods",
+                        metavar="NAME", help="mod folder to process "
+                        "(repeatable)")
+    parser.add_argument("--all", action="store_true",
+                        help="process every eligible mod")
+    parser.add_argument("--settings", type=Path,
+                        help="JSON file of generator settings, as returned "
+                        "by the settings dialog (required for generate)")
+    parser.add_argument("--rename", action="store_true",
+                        help="add a rename field for textures ending in _d")
+    parser.add_argument("--modlist", type=Path,
+                        help="MO2 profile modlist.txt: the load order for "
+                        "generate's conflict report, and update resolves "
+                        "textures across its enabled mods")
+    parser.add_argument("--winners-only", action="store_true",
+                        help="generate a texture's entry only for the "
+                        "selected mod that wins in the load order")
+    parser.add_argument("--analyze", action="store_true",
+                        help="adjust generated entries to their textures' "
+                        "content (needs NumPy)")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="mods generated in parallel (0 = per CPU)")
+    parser.add_argument("--processes", type=int, default=1,
+                        help="update worker processes (1 = in-process, "
+                        "0 = per CPU)")
+    parser.add_argument("--granularity", choices=OUTPUT_GRANULARITIES,
+                        default=OUTPUT_GRANULARITIES[0],
+                        help="one generated JSON per texture, per texture "
+                        "directory or per mod")
+    parser.add_argument("--compact", action="store_true",
+                        help="write JSONs without whitespace")
+    parser.add_argument("--brief-logs", action="store_true",
+                        help="leave per-file lines out of the mod logs")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="write nothing; print the planned creates, "
+                        "updates (as diffs) and deletes")
+    parser.add_argument("--timings", action="store_true",
+                        help="record per-phase timings and I/O counters")
+    parser.add_argument("--profile", action="store_true",
+                        help="run serially under cProfile and tracemalloc "
+                        "and write the reports into the output mod")
+    return parser
+
+
+def main(argv=None) -> int:
+    """Run generate or update mode headlessly; return the exit code.
+
+    Exit codes: 0 on success, 1 when the run reported errors, 2 for
+    invalid arguments.
+    """
+    parser = _build_arg_parser()
+    args = parser.parse_args(argv)
+
+    mods_path = args.mods_path
+    if not mods_path.is_dir():
+        parser.error(f"mods path not found: {mods_path}")
+    if not args.mods and not args.all:
+        parser.error("select mods with --mod NAME or --all")
+
+    settings = {}
+    if args.mode == "generate":
+        if args.settings is None:
+            parser.error("generate needs --settings")
+        try:
+            with open(args.settings, "r", encoding="utf-8") as f:
+                settings = json.load(f)
+        except (json.JSONDecodeError, OSError) as exc:
+            parser.error(f"cannot read settings: {exc}")
+        if not isinstance(settings, dict):
+            parser.error("settings must be a JSON object")
+
+    index_mods = None
+    if args.modlist is not None:
+        try:
+            index_mods = [
+                mods_path / name for name in _read_modlist(args.modlist)
+            ]
+        except OSError as exc:
+            parser.error(f"cannot read modlist: {exc}")
+    if args.winners_only and not index_mods:
+        parser.error("--winners-only needs a --modlist with enabled mods")
+
+    metrics = _new_metrics(args.timings or args.dry_run)
+    with metrics.phase("discovery"):
+        mods_with_pbr, mods_with_patcher = _discover_mods(
+            mods_path, metrics=metrics
+        )
+    if args.mode == "generate":
+        eligible = mods_with_pbr
+    elif index_mods is not None:
+        # The global index lets JSON-only patches use other mods' textures.
+        eligible = list(mods_with_patcher)
+    else:
+        pbr_names = {m.name for m in mods_with_pbr}
+        eligible = [m for m in mods_with_patcher if m.name in pbr_names]
+    eligible = sorted(eligible, key=lambda m: m.name.lower())
+
+    if args.all:
+        selected = eligible
+    else:
+        by_name = {m.name: m for m in eligible}
+        missing = [name for name in args.mods if name not in by_name]
+        if missing:
+            parser.error(
+                "not eligible for " + args.mode + ": " + ", ".join(missing)
+            )
+        selected = [by_name[name] for name in args.mods]
+
+    if args.profile:
+        args.workers = args.processes = 1
+    output_mod = mods_path / (
+        OUTPUT_MOD_NAME if args.mode == "generate"
+        else EXISTING_OUTPUT_MOD_NAME
+    )
 
-    @staticmethod
-    def _write_log(path: Path, lines):
-        path.parent.mkdir(parents=True, exist_ok=True)
-        path.write_text("\n".join(lines), encoding="utf-8")
+    json_style = "compact" if args.compact else "indented"
+    writer = _Plan(output_mod) if args.dry_run else _DISK
+
+    start = time.perf_counter()
+    # A dry run must not create the output mod just for its reports.
+    profile_dir = Path.cwd() if args.dry_run else output_mod
+    with _profiling(profile_dir, args.profile):
+        if args.mode == "generate":
+            counters = _run_generate(
+                mods_path, selected, args.rename, settings, args.workers,
+                metrics, json_style, not args.brief_logs, args.granularity,
+                priority=[m.name for m in index_mods or ()],
+                winners_only=args.winners_only, writer=writer,
+                analyze_textures=args.analyze,
+            )
+        else:
+            counters = _run_update(mods_path, selected, args.rename,
+                                   args.processes, metrics=metrics,
+                                   json_style=json_style,
+                                   verbose_log=not args.brief_logs,
+                                   index_mods=index_mods, writer=writer)
+    elapsed = time.perf_counter() - start
+    if args.dry_run:
+        print("\n".join(writer.report_lines()))
+        print()
+    if args.mode == "generate":
+        print(_generate_summary(counters, metrics))
+    else:
+        print(_update_summary(counters, metrics))
+    print(f"Elapsed:   {elapsed:.2f}s")
+    if args.profile:
+        print(f"Profile:   {profile_dir / 'profile.prof'}")
+    return 1 if counters["errors"] else 0
 
 
 def createPlugin():
     return PBRJsonGenerator()
+
+
+if __name__ == "__main__":
+    sys.exit(main())